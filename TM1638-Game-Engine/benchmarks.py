@@ -0,0 +1,411 @@
+"""
+Benchmarks of the game engine hot paths, run headless against the virtual TM1638 boards.
+
+Usage:
+    python benchmarks.py                          # all benchmarks, JSON results on stdout
+    python benchmarks.py display_line game_loop   # selected benchmarks
+    python benchmarks.py --output results.json --compare previous.json
+    python benchmarks.py scaling --max-boards 8   # frame rate from 1 to 8 chained boards
+
+Copyright (C) 2024  James Kano
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Every result holds the number of calls, calls per second and the latency distribution in microseconds. Where the
+bus is used, the bytes and transactions sent to the virtual boards per call are given too. The numbers measure the
+engine (Python) cost: the virtual boards take no bus time.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from tm1638_game_engine import instrumentation
+from tm1638_game_engine.rpi_tm1638_animations import KEY_READ_PAUSE, TM1638Animated
+from tm1638_game_engine.seg_game_engine import MiniGame, SevenSegButtonGame
+from tm1638_game_engine.virtual_tm1638 import VirtualTMBoards
+
+
+_benchmarks: Dict[str, Callable[[argparse.Namespace], Dict[str, Any]]] = {}
+
+
+def benchmark(name: str) -> Callable:
+    """
+    Registers a benchmark function (taking the command line arguments and returning its results)
+    """
+    def register(func: Callable) -> Callable:
+        _benchmarks[name] = func
+        return func
+    return register
+
+
+def _virtual_tm(boards: int) -> TM1638Animated:
+    """
+    TM1638Animated driving virtual boards
+    """
+    return TM1638Animated(stb=0, clk=0, dio=0, device=VirtualTMBoards(stb=tuple(range(boards))))
+
+
+def time_calls(func: Callable[[int], Any],
+               duration: float,
+               device: Optional[VirtualTMBoards] = None) -> Dict[str, Any]:
+    """
+    Calls func(i) repeatedly for the given duration, timing every call.
+
+    :param func: function to benchmark, called with the index of the call
+    :param duration: seconds to run for
+    :param device: virtual boards whose bus activity is reported per call
+    :return: the results of the benchmark
+    """
+    if device is not None:
+        device.reset_counters()
+    timings: List[int] = []
+    clock = time.perf_counter_ns
+    end = clock() + int(duration * 1e9)
+    calls = 0
+    start = clock()
+    while True:
+        before = clock()
+        func(calls)
+        after = clock()
+        timings.append(after - before)
+        calls += 1
+        if after >= end:
+            break
+    elapsed = (clock() - start) / 1e9
+
+    results = {'calls': calls, 'calls_per_sec': calls / elapsed}
+    results.update(latency_summary(timings))
+    if device is not None:
+        results['bus_bytes_per_call'] = device.bytes_sent / calls
+        results['bus_transactions_per_call'] = device.transactions / calls
+    return results
+
+
+def latency_summary(timings_ns: List[int]) -> Dict[str, float]:
+    """
+    Mean and percentiles (in microseconds) of a list of timings in nanoseconds
+    """
+    ordered = sorted(timings_ns)
+    count = len(ordered)
+
+    def percentile(fraction: float) -> float:
+        return ordered[min(count - 1, int(fraction * count))] / 1e3
+
+    return {'mean_us': sum(ordered) / count / 1e3,
+            'p50_us': percentile(0.5),
+            'p99_us': percentile(0.99),
+            'max_us': ordered[-1] / 1e3}
+
+
+# -------------------- #
+#     Display path     #
+# -------------------- #
+
+@benchmark('display_line')
+def bench_display_line(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Encoding and writing of a changing line of characters
+    """
+    tm = _virtual_tm(args.boards)
+    width = tm.num_segments
+    lines = [(str(i) * width)[:width] for i in range(10)]
+    return time_calls(lambda i: tm.display_line(lines[i % 10]), args.duration, tm.TM1638)
+
+
+@benchmark('display_line_unchanged')
+def bench_display_line_unchanged(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Encoding of a line the display already shows (nothing to send)
+    """
+    tm = _virtual_tm(args.boards)
+    line = 'SAFE' * (tm.num_segments // 4)
+    return time_calls(lambda i: tm.display_line(line), args.duration, tm.TM1638)
+
+
+@benchmark('leds')
+def bench_leds(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    LED writes from the binary form of an integer
+    """
+    tm = _virtual_tm(args.boards)
+    limit = 1 << tm.num_segments
+    return time_calls(lambda i: tm.LEDs(i % limit), args.duration, tm.TM1638)
+
+
+@benchmark('leds_from_left')
+def bench_leds_from_left(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    LED writes of a number of LEDs lit from the left
+    """
+    tm = _virtual_tm(args.boards)
+    count = tm.num_segments + 1
+    return time_calls(lambda i: tm.LEDs_from_left(i % count), args.duration, tm.TM1638)
+
+
+# ------------------ #
+#     Input path     #
+# ------------------ #
+
+@benchmark('read_button_values')
+def bench_read_button_values(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Button reads from the boards (the bus read of check_button_values, without its 0.05 s pause)
+    """
+    tm = _virtual_tm(args.boards)
+    tm.TM1638.set_key_mask(1)
+    return time_calls(lambda i: tm.read_button_values(), args.duration, tm.TM1638)
+
+
+@benchmark('check_button_values')
+def bench_check_button_values(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Button polls as made by the game loops: with the pause between board reads, and from the key scan
+    """
+    tm = _virtual_tm(args.boards)
+    # with the pause of the boards (none on the virtual boards), which caps polling at 20 reads per second: a few
+    # calls are enough
+    tm.key_read_pause = KEY_READ_PAUSE
+    results = {'board_reads': time_calls(lambda i: tm.check_button_values(), min(args.duration, 0.25))}
+    tm.start_key_scan()
+    try:
+        results['key_scan'] = time_calls(lambda i: tm.check_button_values(), args.duration)
+        results['key_scan']['scans_per_sec'] = tm.key_scanner.scans / args.duration
+    finally:
+        tm.stop_key_scan()
+    return results
+
+
+# ----------------- #
+#     Game path     #
+# ----------------- #
+
+def _registered_games(boards: int) -> SevenSegButtonGame:
+    """
+    Game engine on virtual boards with the games of main.py registered
+    """
+    import main
+
+    seg_game = SevenSegButtonGame(stb=0, clk=0, dio=0, device=VirtualTMBoards(stb=tuple(range(boards))))
+    main.register_games(seg_game)
+    return seg_game
+
+
+def _restart(game: MiniGame) -> None:
+    """
+    Resets a finished game and runs its setup again
+    """
+    game._progress = 0
+    game._lives = 2
+    game._alive = True
+    game._show_final_display = False
+    game.setup()
+
+
+def _correct_input(game: MiniGame) -> int:
+    """
+    Button integer of the next correct answer of a game from main.py
+    """
+    answer = game.correct_answer_conditions[game._progress]
+    num_segments = game.tm1638.num_segments
+    if not game.input_as_linear_int:
+        return answer
+    if game.map_input is not None:
+        # the answer digit is found on the display
+        answer = [str(seg) for seg in game.game_seg_display].index(str(answer))
+    return 1 << (num_segments - 1 - answer)
+
+
+@benchmark('minigame_play')
+def bench_minigame_play(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    MiniGame.play() latency of correct answers for each game of main.py (games are restarted once won, the
+    restarts are not timed)
+    """
+    seg_game = _registered_games(args.boards)
+    device = seg_game.tm.TM1638
+    results = {}
+    for name in list(seg_game._game_register):
+        game = seg_game._build_game(name)
+        try:
+            _restart(game)
+        except AssertionError as error:
+            # e.g. a game not supporting the number of boards
+            results[name] = {'error': str(error)}
+            continue
+        timings = []
+        end = time.perf_counter() + args.duration
+        device.reset_counters()
+        while time.perf_counter() < end:
+            if not game.continue_loop:
+                _restart(game)
+            player_input = _correct_input(game)
+            before = time.perf_counter_ns()
+            game.play(player_input)
+            timings.append(time.perf_counter_ns() - before)
+        results[name] = {'turns': len(timings), 'turns_per_sec': len(timings) / args.duration}
+        results[name].update(latency_summary(timings))
+    return results
+
+
+@benchmark('animations')
+def bench_animations(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Frame timing of the built-in animations (and scrolling) at a high frame rate, and the raw cost of showing a frame
+    """
+    tm = _virtual_tm(args.boards)
+    results = {}
+    for name in ('roll', 'wave', 'load', 'unload'):
+        getattr(tm, name)(speed=args.fps)
+    tm.scroll('SCROLLING TEXT', speed=args.fps, mode='bounce')
+    for name in ('roll', 'wave', 'load', 'unload', 'scroll'):
+        stats = tm.animation_stats[name].as_dict()
+        stats['mean_jitter_us'] = stats.pop('mean_jitter') * 1e6
+        stats['max_jitter_us'] = stats.pop('max_jitter') * 1e6
+        results[name] = stats
+    frames = [bytes([1 << (i % 7)]) * tm.num_segments for i in range(7)]
+    results['blit_frame'] = time_calls(lambda i: tm.blit_frame(frames[i % 7]), args.duration, tm.TM1638)
+    return results
+
+
+@benchmark('scaling')
+def bench_scaling(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    How the frame rate scales with the length of the chain (1 to --max-boards boards): whole frames changing on
+    every board, frames changing a single board (the other boards are not written to) and the wave animation
+    """
+    results = {}
+    for boards in range(1, args.max_boards + 1):
+        tm = _virtual_tm(boards)
+        frames = [bytes([1 << (i % 7)]) * tm.num_segments for i in range(7)]
+        board_result = {'frames': time_calls(lambda i: tm.blit_frame(frames[i % 7]), args.duration, tm.TM1638)}
+
+        # only the displays of the last board change
+        last_board = 8 * (boards - 1)
+        board_result['single_board_frames'] = time_calls(
+            lambda i: tm.display_line(str(i % 100000000), start=last_board), args.duration, tm.TM1638)
+
+        tm.wave(speed=args.fps)
+        stats = tm.animation_stats['wave'].as_dict()
+        board_result['wave'] = {'frames': stats['frames'],
+                                'dropped': stats['dropped'],
+                                'mean_jitter_us': stats['mean_jitter'] * 1e6}
+        results[f'{boards}_boards'] = board_result
+    return results
+
+
+@benchmark('game_loop')
+def bench_game_loop(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    End-to-end game_loop() iterations while idle (input from the key scan, so the loop does not pause) and
+    while a correct answer is pressed every other iteration
+    """
+    seg_game = _registered_games(args.boards)
+    seg_game.select_game('math')
+    seg_game._animations.clear()
+    seg_game.in_standby = False
+    seg_game.setup()
+    seg_game.selected_game.intro_animation = None
+    seg_game._show_game_display()
+    game = seg_game.selected_game
+    device = seg_game.tm.TM1638
+
+    seg_game.tm.start_key_scan()
+    try:
+        results = {'idle': time_calls(lambda i: seg_game.game_loop(), args.duration, device)}
+    finally:
+        seg_game.tm.stop_key_scan()
+
+    def turn(i: int) -> None:
+        if not game.continue_loop:
+            _restart(game)
+        device.set_key_mask(_correct_input(game) if i % 2 == 0 else 0)
+        seg_game.game_loop()
+
+    # board reads without the pause of check_button_values, each pressed iteration plays a turn
+    seg_game.tm.check_button_values = seg_game.tm.read_button_values
+    results['playing'] = time_calls(turn, args.duration, device)
+    return results
+
+
+# ------------------ #
+#     Comparison     #
+# ------------------ #
+
+def compare(current: Dict[str, Any],
+            previous: Dict[str, Any],
+            prefix: str = '') -> List[str]:
+    """
+    Lines comparing the rates and mean latencies of two result sets
+    """
+    lines = []
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            lines += compare(value, old, f'{prefix}{key}.')
+        elif key.endswith(('_per_sec', 'mean_us')) and isinstance(old, (int, float)) and old:
+            lines.append(f'{prefix}{key}: {old:.1f} -> {value:.1f} ({(value / old - 1) * 100:+.1f}%)')
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('benchmarks', nargs='*', help=f'benchmarks to run, all by default ({", ".join(_benchmarks)})')
+    parser.add_argument('--duration', type=float, default=1.0, help='seconds per measurement')
+    parser.add_argument('--boards', type=int, default=1, help='number of chained virtual boards')
+    parser.add_argument('--fps', type=int, default=100, help='frame rate of the animation benchmarks')
+    parser.add_argument('--max-boards', type=int, default=8, help='longest chain of the scaling benchmark')
+    parser.add_argument('--output', help='file to write the JSON results to (stdout by default)')
+    parser.add_argument('--instrument', action='store_true',
+                        help='enables the engine probes and adds their stats to the results of each benchmark')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with (printed to stderr)')
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(_benchmarks)
+    if unknown:
+        parser.error(f'unknown benchmark(s): {", ".join(sorted(unknown))}')
+
+    results = {'meta': {'python': platform.python_version(),
+                        'implementation': platform.python_implementation(),
+                        'machine': platform.machine(),
+                        'boards': args.boards,
+                        'duration': args.duration,
+                        'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+               'results': {}}
+    for name in args.benchmarks or _benchmarks:
+        print(f'running {name}...', file=sys.stderr)
+        if args.instrument:
+            instrumentation.enable()
+        results['results'][name] = _benchmarks[name](args)
+        if args.instrument:
+            results['results'][name]['instrumentation'] = instrumentation.stats()
+            instrumentation.disable()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+        print('\n'.join(compare(results['results'], previous['results'])), file=sys.stderr)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Converts the built-in animations of TM1638Animated to animation files (see tm1638_game_engine/animation_file.py).
+
+Usage:
+    python convert_animations.py                              # roll, wave, load and unload for 1 board in ./animations
+    python convert_animations.py roll wave --boards 2 --output-dir assets --speed 20
+    python convert_animations.py roll --rolls 10              # animation parameters
+
+Copyright (C) 2024  James Kano
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+The files are named <animation>.tmaf, and are played with TM1638Animated.play_file().
+"""
+import argparse
+import os
+from typing import Dict, List, Optional, Tuple
+
+from tm1638_game_engine.animation_file import write_animation
+from tm1638_game_engine.animation_frames import animation_frames
+
+EXTENSION: str = '.tmaf'
+
+
+def convert(names: List[str],
+            output_dir: str,
+            num_boards: int = 1,
+            speed: float = 10,
+            rolls: int = 3,
+            waves: int = 2) -> Dict[str, str]:
+    """
+    Writes built-in animations to animation files
+
+    :param names: names of the animations (roll, wave, load, unload)
+    :param output_dir: directory the files are written to (created if needed)
+    :param num_boards: number of chained boards the animations are made for
+    :param speed: frame rate of the animations (frames per second)
+    :param rolls: number of rolls of the roll animation
+    :param waves: number of waves of the wave animation
+    :return: path of the file written for each animation
+    """
+    params: Dict[str, Tuple[int, ...]] = {'roll': (rolls,), 'wave': (waves,), 'load': (), 'unload': ()}
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for name in names:
+        path = os.path.join(output_dir, name + EXTENSION)
+        write_animation(path, animation_frames(name, 8 * num_boards, *params[name]), speed, num_boards)
+        paths[name] = path
+    return paths
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, str]:
+    animations = ['roll', 'wave', 'load', 'unload']
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*', default=animations, help=f'animations ({", ".join(animations)})')
+    parser.add_argument('--output-dir', default='animations', help='directory the files are written to')
+    parser.add_argument('--boards', type=int, default=1, help='number of chained boards')
+    parser.add_argument('--speed', type=float, default=10, help='frame rate (frames per second)')
+    parser.add_argument('--rolls', type=int, default=3, help='number of rolls (roll)')
+    parser.add_argument('--waves', type=int, default=2, help='number of waves (wave)')
+    args = parser.parse_args(argv)
+    unknown = set(args.names) - set(animations)
+    if unknown:
+        parser.error(f'unknown animation(s): {", ".join(sorted(unknown))}')
+
+    paths = convert(args.names, args.output_dir, args.boards, args.speed, args.rolls, args.waves)
+    for name, path in paths.items():
+        print(f'{name}: {path} ({os.path.getsize(path)} bytes)')
+    return paths
+
+
+if __name__ == '__main__':
+    main()
@@ -18,13 +18,23 @@ Copyright (C) 2023  James Kano
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from random import randint, shuffle
 import time
-from typing import Any, Dict, List
+# start of the import of this file (startup_time() falls back to it)
+_import_time = time.monotonic()
 
+from random import Random
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from tm1638_game_engine.animation_frames import FrameSequence
+from tm1638_game_engine.frame_scheduler import pause
 from tm1638_game_engine.rpi_tm1638_animations import TM1638Animated as Tm
+from tm1638_game_engine.seg_font import encode_line
 from tm1638_game_engine.seg_game_engine import SevenSegButtonGame, MiniGame
 
+if TYPE_CHECKING:
+    # recording and replay are loaded when used, nothing but the games is loaded at boot
+    from tm1638_game_engine.session_recorder import ReplayResult
+
 
 # ------------------- #
 #     Memory game     #
@@ -34,21 +44,16 @@ from tm1638_game_engine.seg_game_engine import SevenSegButtonGame, MiniGame
 mem_win_length = 5
 
 
-def memory_setup(tm1638: Tm) -> Any:
+def memory_puzzle(tm1638: Tm,
+                  rng: Random) -> Dict[str, Any]:
     """
-    Setup answers and starting display for memory game
+    Answers and starting display for memory game
 
     :param tm1638: tm1638 interface (auto-assigned by MiniGame)
+    :param rng: random number generator of the game (auto-assigned by MiniGame)
     :return: dictionary of game attributes to set up
     """
-    memorable_sequence = [1 << randint(0, 7) for i in range(mem_win_length)]
-    for led_num in memorable_sequence:
-        tm1638.LEDs(led_num)
-        time.sleep(0.5)
-        tm1638.LEDs(0)
-        time.sleep(0.25)
-        tm1638.display_line('-' * mem_win_length)
-
+    memorable_sequence = [1 << rng.randint(0, tm1638.num_leds - 1) for i in range(mem_win_length)]
     start_seg_display = [64] * mem_win_length
 
     return_dict = {
@@ -59,6 +64,29 @@ def memory_setup(tm1638: Tm) -> Any:
     return return_dict
 
 
+def memory_setup(tm1638: Tm,
+                 correct_answer_conditions: List[int]) -> Dict[str, Any]:
+    """
+    Setup of the sequence animation for memory game
+
+    :param tm1638: tm1638 interface (auto-assigned by MiniGame)
+    :param correct_answer_conditions: the sequence to be remembered (auto-assigned by MiniGame)
+    :return: dictionary of game attributes to set up
+    """
+    memorable_sequence = correct_answer_conditions
+
+    # show each LED for 0.5 seconds followed by 0.25 seconds off (4 frames per second)
+    led_frames = []
+    for led_num in memorable_sequence:
+        led_frames += [led_num, led_num, 0]
+    seg_frame = encode_line('-' * mem_win_length, tm1638.num_segments)
+    sequence_frames = FrameSequence(seg_frame * len(led_frames), tm1638.num_segments, leds=led_frames)
+    # the sequence must be seen to play the game, so it cannot be skipped
+    intro_animation = tm1638.play_frames(sequence_frames, speed=4, name='memory', block=False, cancellable=False)
+
+    return {'intro_animation': intro_animation}
+
+
 def memory_correct_answer_action(progress: int) -> List[Any]:
     """
     Display / response when a correct answer is given for memory game
@@ -74,10 +102,18 @@ def memory_correct_answer_action(progress: int) -> List[Any]:
     return current_seg_display
 
 
-memory_game = MiniGame(win_length=mem_win_length)
-memory_game.setup_routine = memory_setup
-memory_game.correct_answer_action = memory_correct_answer_action
-memory_game.input_as_linear_int = False
+def make_memory_game(tm1638: Optional[Tm] = None) -> MiniGame:
+    """
+    Creates a memory game (a MiniGame is played once, every station or round needs its own)
+
+    :param tm1638: tm1638 interface (assigned when registered if None)
+    """
+    memory_game = MiniGame(win_length=mem_win_length, tm1638=tm1638)
+    memory_game.puzzle_generator = memory_puzzle
+    memory_game.setup_routine = memory_setup
+    memory_game.correct_answer_action = memory_correct_answer_action
+    memory_game.input_as_linear_int = False
+    return memory_game
 
 
 # ----------------- #
@@ -85,47 +121,56 @@ memory_game.input_as_linear_int = False
 # ----------------- #
 # Demonstrates use of MiniGame class by instantiating with methods
 
-math_answer_num = randint(1, 256)
-math_answer_num_str = str(math_answer_num)
-math_win_length = len(math_answer_num_str)
-
-
-def math_setup(tm1638: Tm) -> Dict[str, Any]:
+def math_puzzle(tm1638: Tm,
+                rng: Random) -> Dict[str, Any]:
     """
-    Setup answers and starting display for math game
+    Answers and starting display for math game
 
     :param tm1638: tm1638 interface (auto-assigned by MiniGame)
+    :param rng: random number generator of the game (auto-assigned by MiniGame)
     :return: dictionary of game attributes to set up
     """
-    tm1638.load(50)
-    time.sleep(0.5)
-    tm1638.unload(50)
-
-    # generate the answer at random
-    answer_list = [int(i) for i in math_answer_num_str]
+    # generate the answer at random (shown in binary on the LEDs)
+    answer_num = rng.randint(1, (1 << tm1638.num_leds) - 1)
+    answer_list = [int(i) for i in str(answer_num)]
 
     # assign random segment positions to the answer integers
     answer_int_positions = {}
     for i in range(len(answer_list)):
-        rand_position = randint(0, tm1638.num_segments - 1)
+        rand_position = rng.randint(0, tm1638.num_segments - 1)
         while rand_position in answer_int_positions:
-            rand_position = randint(0, tm1638.num_segments - 1)
+            rand_position = rng.randint(0, tm1638.num_segments - 1)
         answer_int_positions[rand_position] = int(answer_list[i])
 
     # generate answer sequence and starting display
-    start_seg_display = [str(randint(0, 9)) if i not in answer_int_positions
+    start_seg_display = [str(rng.randint(0, 9)) if i not in answer_int_positions
                          else str(answer_int_positions[i])
                          for i in range(tm1638.num_segments)]
 
     return_dict = {
         'correct_answer_conditions': answer_list,
         'game_seg_display': start_seg_display,
-        'game_LED_display': math_answer_num
+        'game_LED_display': answer_num,
+        'win_length': len(answer_list),
     }
 
     return return_dict
 
 
+def math_setup(tm1638: Tm) -> Dict[str, Any]:
+    """
+    Setup of the intro animation for math game
+
+    :param tm1638: tm1638 interface (auto-assigned by MiniGame)
+    :return: dictionary of game attributes to set up
+    """
+    intro_animation = [tm1638.load(50, block=False),
+                       pause(0.5),
+                       tm1638.unload(50, block=False)]
+
+    return {'intro_animation': intro_animation}
+
+
 def math_map_input(input_button: int,
                    game_seg_display: List[int]) -> int:
     """
@@ -142,16 +187,24 @@ def math_incorrect_answer_action(tm1638: Tm) -> List[Any]:
     :param tm1638: tm1638 interface (auto-assigned by MiniGame)
     """
     tm1638.display_line("Error")
-    time.sleep(1)
     return 0
 
 
-math_game = MiniGame(win_length=math_win_length,
-                     setup_routine=math_setup,
-                     map_input=math_map_input,
-                     incorrect_answer_action=math_incorrect_answer_action,
-                     show_button_feedback=False,
-                     input_as_linear_int=True)
+def make_math_game(tm1638: Optional[Tm] = None) -> MiniGame:
+    """
+    Creates a math game
+
+    :param tm1638: tm1638 interface (assigned when registered if None)
+    """
+    # the win length is set with the answer, by the puzzle
+    return MiniGame(win_length=0,
+                    tm1638=tm1638,
+                    puzzle_generator=math_puzzle,
+                    setup_routine=math_setup,
+                    map_input=math_map_input,
+                    incorrect_answer_action=math_incorrect_answer_action,
+                    show_button_feedback=False,
+                    input_as_linear_int=True)
 
 
 # ------------------------------ #
@@ -173,33 +226,31 @@ class SpatialGame(MiniGame):
         self.win_length: int = int(self.tm1638.num_segments / 2)
         super().__init__(win_length=self.win_length,
                          tm1638=self.tm1638)
+        self.puzzle_generator: callable = self.spatial_puzzle
         self.setup_routine: callable = self.spatial_setup
         self.correct_answer_action: callable = self.spatial_correct_answer_action
         self.input_as_linear_int: bool = True
 
-    def spatial_setup(self, tm1638: Tm) -> Dict[str, Any]:
+    def spatial_puzzle(self, rng: Random) -> Dict[str, Any]:
         """
-        Setup answers and starting display for spatial reasoning game
+        Answers and starting display for spatial reasoning game
 
-        :param tm1638: tm1638 interface (auto-assigned by MiniGame)
+        :param rng: random number generator of the game (auto-assigned by MiniGame)
         :return: dictionary of game attributes to set up
         """
-
-        tm1638.wave()
-
         # Generate the fragments
-        fragment_nums = [randint(1, 127) for i in range(self.win_length)]
+        fragment_nums = [rng.randint(1, 127) for i in range(self.win_length)]
         counterpart_fragments = [127 - frag for frag in fragment_nums]
 
         # Randomise the fragment order
-        counterpart_shuffle = list(range(4))
-        shuffle(counterpart_shuffle)
+        counterpart_shuffle = list(range(self.win_length))
+        rng.shuffle(counterpart_shuffle)
 
         for i in range(len(counterpart_shuffle)):
             place = counterpart_shuffle.index(i)
             fragment_nums.append(counterpart_fragments[place])
 
-        correct_answer_sequence = [i + 4 for i in counterpart_shuffle]
+        correct_answer_sequence = [i + self.win_length for i in counterpart_shuffle]
 
         return_dict = {
             'correct_answer_conditions': correct_answer_sequence,
@@ -208,6 +259,15 @@ class SpatialGame(MiniGame):
 
         return return_dict
 
+    def spatial_setup(self, tm1638: Tm) -> Dict[str, Any]:
+        """
+        Setup of the intro animation for spatial reasoning game
+
+        :param tm1638: tm1638 interface (auto-assigned by MiniGame)
+        :return: dictionary of game attributes to set up
+        """
+        return {'intro_animation': tm1638.wave(block=False)}
+
     def spatial_correct_answer_action(self) -> List[int]:
         """
         Display / response when a correct answer is given for spatial reasoning game
@@ -217,40 +277,189 @@ class SpatialGame(MiniGame):
         updated_seg_display = self.game_seg_display
         updated_seg_display[self._progress - 1] = 127
 
-        updated_LED_display = 1 << 8 - self._progress
+        updated_LED_display = 1 << self.tm1638.num_leds - self._progress
         self.tm1638.LEDs(updated_LED_display)
         self.game_LED_display = updated_LED_display
 
         return updated_seg_display
 
 
-def run_tm1638_games():
+# functions creating each game for a tm1638 interface (also used by simulation.py)
+game_factories: Dict[str, Callable[[Tm], MiniGame]] = {
+    'memory': make_memory_game,
+    'math': make_math_game,
+    'space': SpatialGame,
+}
+
+
+def register_games(seg_game: SevenSegButtonGame) -> None:
+    """
+    Registers the mini games with the main game object (each game is created when it is selected)
+    """
+    for name, make_game in game_factories.items():
+        seg_game.register_game(name, make_game)
+
+
+def run_tm1638_games(record_path: Optional[str] = None):
     """
     Main method to be executed upon microcontroller boot
+
+    :param record_path: if given, the session is recorded to this file (see replay_tm1638_session())
     """
     # setup for main execution
     seg_game = SevenSegButtonGame(stb=26,
                                   clk=13,
                                   dio=19)
 
-    seg_game.register_game('memory', memory_game)
-    seg_game.register_game('math', math_game)
+    register_games(seg_game)
 
-    spatial_game = SpatialGame(tm1638 = seg_game.tm)
-    seg_game.register_game('space', spatial_game)
+    recorder = None
+    if record_path is not None:
+        from tm1638_game_engine.session_recorder import SessionRecorder
 
-    seg_game.select_game()
+        recorder = SessionRecorder(record_path)
+        recorder.attach(seg_game)
+
+    try:
+        seg_game.select_game()
+
+        while seg_game.selected_game.continue_loop:
+            if seg_game.in_standby:
+                seg_game.standby_start_loop()
+            else:
+                seg_game.game_loop()
+
+        time.sleep(2)
+        seg_game.tm.clear_display()
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+
+def replay_tm1638_session(record_path: str,
+                          real_time: bool = False) -> 'ReplayResult':
+    """
+    Replays a session recorded by run_tm1638_games() on virtual boards and checks the game frames shown
+
+    :param record_path: the session log
+    :param real_time: replays the inputs at their recorded times instead of as fast as possible
+    """
+    from tm1638_game_engine.session_recorder import SessionReplayer
+    from tm1638_game_engine.virtual_tm1638 import VirtualTMBoards
+
+    replayer = SessionReplayer(record_path)
+    seg_game = SevenSegButtonGame(stb=26,
+                                  clk=13,
+                                  dio=19,
+                                  device=VirtualTMBoards(stb=tuple(range(replayer.num_boards))))
+    register_games(seg_game)
+    return replayer.replay(seg_game, real_time=real_time)
+
+
+def run_tm1638_games_async(key_scan_rate: Optional[float] = None):
+    """
+    Alternative to run_tm1638_games() running the game as a single asyncio task (no busy loop)
+
+    :param key_scan_rate: if given, the buttons are read by a background key scan at this rate (reads per second)
+    """
+    import asyncio
+    from tm1638_game_engine.async_game_engine import AsyncSevenSegButtonGame
+
+    seg_game = AsyncSevenSegButtonGame(stb=26,
+                                       clk=13,
+                                       dio=19,
+                                       key_scan_rate=key_scan_rate)
 
-    while seg_game.selected_game.continue_loop:
-        if seg_game.in_standby:
-            seg_game.standby_start_loop()
-        else:
-            seg_game.game_loop()
+    register_games(seg_game)
+
+    asyncio.run(seg_game.run())
+
+
+def run_tm1638_stations(station_pins: Sequence[Tuple[int, int, int]],
+                        rounds: Optional[int] = None,
+                        key_scan_rate: Optional[float] = None) -> None:
+    """
+    Runs several stations from one process, each playing game after game (see tm1638_game_engine/stations.py)
+
+    :param station_pins: (stb, clk, dio) pins of each station
+    :param rounds: number of games played by each station (None to play forever)
+    :param key_scan_rate: if given, the buttons of each station are read by a background key scan at this rate
+    """
+    import asyncio
+    from tm1638_game_engine.async_game_engine import AsyncSevenSegButtonGame
+    from tm1638_game_engine.stations import StationManager
+
+    manager = StationManager()
+    for index, (stb, clk, dio) in enumerate(station_pins):
+        manager.add_station(f'station-{index + 1}',
+                            AsyncSevenSegButtonGame(stb=stb, clk=clk, dio=dio, key_scan_rate=key_scan_rate),
+                            register_games=register_games,
+                            rounds=rounds)
+
+    asyncio.run(manager.run())
+
+
+def startup_time() -> float:
+    """
+    Seconds since the interpreter started (read from /proc on Linux, since the import of this file otherwise)
+    """
+    import os
+
+    try:
+        with open('/proc/self/stat') as stat:
+            # field 22, the start time of the process in clock ticks since boot
+            start_ticks = int(stat.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as uptime:
+            return float(uptime.read().split()[0]) - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _import_time
+
+
+def measure_startup(device: Optional[object] = None) -> Dict[str, float]:
+    """
+    Starts the games as run_tm1638_games() does, up to the first frame shown on the boards, and times the start up
+
+    :param device: driver used instead of the rpi_TM1638 boards (e.g. VirtualTMBoards)
+    :return: seconds since the interpreter started at each step: 'imported' (main.py loaded), 'boards_ready' and
+        'first_frame'
+    """
+    times = {'imported': startup_time()}
+    seg_game = SevenSegButtonGame(stb=26,
+                                  clk=13,
+                                  dio=19,
+                                  device=device)
+    times['boards_ready'] = startup_time()
+
+    def on_commit(image: bytearray, animation: bool) -> None:
+        if 'first_frame' not in times:
+            times['first_frame'] = startup_time()
+
+    seg_game.tm.on_commit = on_commit
+    register_games(seg_game)
+    # select_game() draws the first frame of the roll, before any button read
+    seg_game.select_game()
+    while 'first_frame' not in times:
+        seg_game.standby_start_loop()
 
-    time.sleep(2)
+    seg_game.tm.on_commit = None
     seg_game.tm.clear_display()
+    return times
 
 
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
-    run_tm1638_games()
+    import sys
+
+    if '--startup-time' in sys.argv:
+        # python main.py --startup-time [--virtual] [--budget SECONDS]: boot-to-first-frame time
+        device = None
+        if '--virtual' in sys.argv:
+            from tm1638_game_engine.virtual_tm1638 import VirtualTMBoards
+            device = VirtualTMBoards()
+        startup = measure_startup(device)
+        print(', '.join(f'{step}: {seconds * 1000:.1f} ms' for step, seconds in startup.items()))
+        if '--budget' in sys.argv:
+            budget = float(sys.argv[sys.argv.index('--budget') + 1])
+            sys.exit(0 if startup['first_frame'] <= budget else 1)
+    else:
+        run_tm1638_games()
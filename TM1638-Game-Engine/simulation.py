@@ -0,0 +1,315 @@
+"""
+Headless simulation of MiniGames played by bots, to tune the difficulty of the games over many rounds.
+
+Usage:
+    python simulation.py                                  # every game of main.py with every bot, 1000 rounds each
+    python simulation.py --games math space --bots noisy --accuracy 0.8 --rounds 10000
+    python simulation.py --games my_games:make_puzzle     # a user game, from a function creating it for a tm1638
+
+Copyright (C) 2024  James Kano
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+Rounds are played on virtual boards, in batches spread across a process pool. Each round gives the game its own
+random.Random (injected into the callbacks taking 'rng'), seeded from the simulation seed, the game and the round
+number, so that a simulation is reproducible and every bot faces the same puzzles. The bots draw from separate
+streams. The pauses of the turns (e.g. the error screen) are skipped.
+"""
+import argparse
+import importlib
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+from time import perf_counter_ns, sleep
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from tm1638_game_engine.instrumentation import Histogram
+from tm1638_game_engine.rpi_tm1638_animations import TM1638Animated
+from tm1638_game_engine.seg_game_engine import MiniGame
+from tm1638_game_engine.virtual_tm1638 import VirtualTMBoards
+
+# function creating a MiniGame for a tm1638 interface (must be importable by the worker processes)
+GameFactory = Callable[[TM1638Animated], MiniGame]
+
+
+# -------------- #
+#     Bots       #
+# -------------- #
+
+class Bot(ABC):
+    """
+    Chooses the button input of each turn of a MiniGame
+    """
+    @abstractmethod
+    def choose(self,
+               game: MiniGame,
+               rng: Random) -> int:
+        """
+        :param game: the game being played
+        :param rng: random number generator of the bot
+        :return: integer of the button(s) pressed
+        """
+
+
+def _random_button(game: MiniGame,
+                   rng: Random) -> int:
+    return 1 << rng.randrange(game.tm1638.num_segments)
+
+
+class RandomBot(Bot):
+    """
+    Presses a button at random
+    """
+    def choose(self, game: MiniGame, rng: Random) -> int:
+        return _random_button(game, rng)
+
+
+class PerfectBot(Bot):
+    """
+    Presses a button giving the correct answer (a random button if there is none)
+    """
+    def choose(self, game: MiniGame, rng: Random) -> int:
+        answer = int(game.correct_answer_conditions[game._progress])
+        for button in range(game.tm1638.num_segments):
+            input_button = 1 << button
+            if int(game.answer_for(input_button)) == answer:
+                return input_button
+        return _random_button(game, rng)
+
+
+class NoisyBot(PerfectBot):
+    """
+    Gives the correct answer with a given probability, presses a random button otherwise
+    """
+    def __init__(self,
+                 accuracy: float = 0.9) -> None:
+        """
+        :param accuracy: probability of giving the correct answer
+        """
+        self.accuracy: float = accuracy
+
+    def choose(self, game: MiniGame, rng: Random) -> int:
+        if rng.random() < self.accuracy:
+            return super().choose(game, rng)
+        return _random_button(game, rng)
+
+
+# ------------------ #
+#     Simulation     #
+# ------------------ #
+
+class SimulationResult(NamedTuple):
+    """
+    Aggregated outcome of the rounds of a game played by a bot
+    """
+    game: str
+    bot: str
+    rounds: int
+    wins: int
+    unfinished: int  # rounds stopped after max_turns
+    turns: int
+    turn_latency: Histogram
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.rounds if self.rounds else 0.0
+
+    @property
+    def mean_turns(self) -> float:
+        return self.turns / self.rounds if self.rounds else 0.0
+
+
+class _Batch(NamedTuple):
+    """
+    Rounds played by one worker task
+    """
+    game_name: str
+    make_game: GameFactory
+    bot_name: str
+    bot: Bot
+    seed: int
+    first_round: int
+    rounds: int
+    boards: int
+    max_turns: int
+
+
+def _play_turn(game: MiniGame,
+               input_button: int) -> None:
+    """
+    Plays a turn like MiniGame.play(), skipping its pauses
+    """
+    turn = game._turn(input_button)
+    result = None
+    try:
+        while True:
+            callback, args, kwargs = turn.send(result)
+            result = None if callback is sleep else callback(*args, **kwargs)
+    except StopIteration:
+        pass
+
+
+def _play_batch(batch: _Batch) -> SimulationResult:
+    """
+    Plays the rounds of a batch (in a worker process)
+    """
+    tm = TM1638Animated(stb=0, clk=0, dio=0, device=VirtualTMBoards(stb=tuple(range(batch.boards))))
+    latency = Histogram()
+    wins = unfinished = turns = 0
+    for round_number in range(batch.first_round, batch.first_round + batch.rounds):
+        game = batch.make_game(tm)
+        if game.tm1638 is None:
+            game.tm1638 = tm
+        # the puzzles only depend on the game and the round, the bot choices have their own stream
+        game.rng = Random(f'{batch.seed}/{batch.game_name}/{round_number}')
+        bot_rng = Random(f'{batch.seed}/{batch.game_name}/{round_number}/{batch.bot_name}')
+        game.setup()
+
+        round_turns = 0
+        while game.continue_loop and round_turns < batch.max_turns:
+            input_button = batch.bot.choose(game, bot_rng)
+            start = perf_counter_ns()
+            _play_turn(game, input_button)
+            latency.record(perf_counter_ns() - start)
+            round_turns += 1
+
+        turns += round_turns
+        if game.continue_loop:
+            unfinished += 1
+        elif game._alive:
+            wins += 1
+    return SimulationResult(batch.game_name, batch.bot_name, batch.rounds, wins, unfinished, turns, latency)
+
+
+def simulate(games: Dict[str, GameFactory],
+             bots: Dict[str, Bot],
+             rounds: int = 1000,
+             seed: int = 0,
+             workers: Optional[int] = None,
+             batch_size: int = 100,
+             boards: int = 1,
+             max_turns: int = 1000) -> List[SimulationResult]:
+    """
+    Plays rounds of every game with every bot
+
+    :param games: functions creating each game for a tm1638 interface (module level functions or classes, to be
+        sent to the worker processes)
+    :param bots: the bots to play the games with
+    :param rounds: number of rounds of each game played by each bot
+    :param seed: seed of the simulation
+    :param workers: number of worker processes (the number of CPUs by default, 1 plays in this process)
+    :param batch_size: number of rounds per worker task
+    :param boards: number of chained virtual boards
+    :param max_turns: turns after which a round is stopped as unfinished
+    :return: one result per game and bot
+    """
+    batches = [_Batch(game_name, make_game, bot_name, bot, seed, first_round,
+                      min(batch_size, rounds - first_round), boards, max_turns)
+               for game_name, make_game in games.items()
+               for bot_name, bot in bots.items()
+               for first_round in range(0, rounds, batch_size)]
+
+    if workers == 1:
+        return _aggregate(map(_play_batch, batches))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return _aggregate(executor.map(_play_batch, batches))
+
+
+def _aggregate(batch_results) -> List[SimulationResult]:
+    """
+    Sums the batch results of each game and bot
+    """
+    totals: Dict[Tuple[str, str], SimulationResult] = {}
+    for result in batch_results:
+        key = (result.game, result.bot)
+        total = totals.get(key)
+        if total is None:
+            totals[key] = result
+            continue
+        total.turn_latency.merge(result.turn_latency)
+        totals[key] = total._replace(rounds=total.rounds + result.rounds,
+                                     wins=total.wins + result.wins,
+                                     unfinished=total.unfinished + result.unfinished,
+                                     turns=total.turns + result.turns)
+    return list(totals.values())
+
+
+def result_table(results: List[SimulationResult]) -> str:
+    """
+    Formats simulation results as a compact text table
+    """
+    header = ('game', 'bot', 'rounds', 'win %', 'turns', 'unfinished', 'turn p50 us', 'turn p99 us')
+    rows = [header] + [(result.game,
+                        result.bot,
+                        str(result.rounds),
+                        f'{result.win_rate * 100:.1f}',
+                        f'{result.mean_turns:.2f}',
+                        str(result.unfinished),
+                        f'{result.turn_latency.percentile(0.5):g}',
+                        f'{result.turn_latency.percentile(0.99):g}')
+                       for result in results]
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    return '\n'.join('  '.join(cell.ljust(width) if column < 2 else cell.rjust(width)
+                               for column, (cell, width) in enumerate(zip(row, widths)))
+                     for row in rows)
+
+
+def _game_factory(spec: str) -> GameFactory:
+    """
+    Game factory from a game name of main.py or a 'module:function' specification
+    """
+    if ':' in spec:
+        module_name, attr = spec.split(':', 1)
+        return getattr(importlib.import_module(module_name), attr)
+    import main
+    return main.game_factories[spec]
+
+
+def main(argv: Optional[List[str]] = None) -> List[SimulationResult]:
+    bot_types: Dict[str, Callable[[argparse.Namespace], Bot]] = {
+        'perfect': lambda args: PerfectBot(),
+        'noisy': lambda args: NoisyBot(args.accuracy),
+        'random': lambda args: RandomBot(),
+    }
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--games', nargs='*', default=['memory', 'math', 'space'],
+                        help="games of main.py or 'module:function' creating a game for a tm1638 interface")
+    parser.add_argument('--bots', nargs='*', default=list(bot_types), help=f'bots ({", ".join(bot_types)})')
+    parser.add_argument('--accuracy', type=float, default=0.9, help='probability of a correct answer (noisy bot)')
+    parser.add_argument('--rounds', type=int, default=1000, help='rounds of each game per bot')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the simulation')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--batch-size', type=int, default=100, help='rounds per worker task')
+    parser.add_argument('--boards', type=int, default=1, help='number of chained virtual boards')
+    parser.add_argument('--max-turns', type=int, default=1000, help='turns after which a round is unfinished')
+    args = parser.parse_args(argv)
+    unknown = set(args.bots) - set(bot_types)
+    if unknown:
+        parser.error(f'unknown bot(s): {", ".join(sorted(unknown))}')
+
+    results = simulate({spec: _game_factory(spec) for spec in args.games},
+                       {name: bot_types[name](args) for name in args.bots},
+                       rounds=args.rounds,
+                       seed=args.seed,
+                       workers=args.workers,
+                       batch_size=args.batch_size,
+                       boards=args.boards,
+                       max_turns=args.max_turns)
+    print(result_table(results))
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import pytest
+
+from tm1638_game_engine.animation_file import HEADER, AnimationFile, write_animation
+from tm1638_game_engine.animation_frames import FrameSequence, animation_frames
+
+
+def write(tmp_path, frames, speed=10, num_boards=1, name='animation.tmaf') -> str:
+    path = str(tmp_path / name)
+    write_animation(path, frames, speed, num_boards)
+    return path
+
+
+def test_round_trip(tmp_path):
+    frames = FrameSequence(bytes(range(48)), 16, leds=[0x8001, 0, 0xffff])
+    path = write(tmp_path, frames, speed=12.5, num_boards=2)
+    with AnimationFile(path) as animation:
+        assert (animation.num_boards, animation.width, animation.speed) == (2, 16, 12.5)
+        assert len(animation) == len(frames)
+        assert [bytes(frame) for frame in animation] == [bytes(frame) for frame in frames]
+        assert bytes(animation[-1]) == bytes(frames[-1])
+        assert [animation.leds[i] for i in range(len(animation))] == [frames.leds[i] for i in range(len(frames))]
+        with pytest.raises(IndexError):
+            animation[len(frames)]
+
+
+def test_round_trip_without_leds(tmp_path):
+    frames = animation_frames('wave', 8, 1)
+    assert frames.leds is None
+    with AnimationFile(write(tmp_path, frames)) as animation:
+        assert animation.leds is None
+        assert [bytes(frame) for frame in animation] == [bytes(frame) for frame in frames]
+
+
+def test_frames_must_fit_the_boards(tmp_path):
+    with pytest.raises(AssertionError):
+        write(tmp_path, animation_frames('load', 8), num_boards=2)
+
+
+@pytest.mark.parametrize('size', [0, 4, HEADER.size - 1])
+def test_truncated_header(tmp_path, size):
+    path = write(tmp_path, animation_frames('load', 8))
+    with open(path, 'r+b') as file:
+        file.truncate(size)
+    with pytest.raises(ValueError, match='not an animation file'):
+        AnimationFile(path)
+
+
+@pytest.mark.parametrize('offset, value', [(0, ord('X')), (4, 2)])
+def test_corrupt_header(tmp_path, offset, value):
+    path = write(tmp_path, animation_frames('load', 8))
+    with open(path, 'r+b') as file:
+        file.seek(offset)
+        file.write(bytes([value]))
+    with pytest.raises(ValueError, match='not a version 1 animation file'):
+        AnimationFile(path)
+
+
+def test_truncated_frames(tmp_path):
+    path = write(tmp_path, FrameSequence(b'\x01' * 24, 8, leds=[1, 2, 3]))
+    with open(path, 'r+b') as file:
+        file.truncate(HEADER.size + 2 * 9 + 1)
+    with pytest.raises(ValueError, match='truncated'):
+        AnimationFile(path)
@@ -0,0 +1,97 @@
+from tm1638_game_engine.input_decoder import CHORD, LONG_PRESS, PRESS, REPEAT, InputDecoder, button_indexes
+from tm1638_game_engine.key_scanner import KeyScanner
+from tm1638_game_engine.seg_game_engine import SevenSegButtonGame
+from tm1638_game_engine.virtual_tm1638 import VirtualTMBoards
+
+
+def kinds(events):
+    return [event.kind for event in events]
+
+
+def test_press():
+    decoder = InputDecoder(16)
+    event, = decoder.update(0x0100, 1.0)
+    assert (event.kind, event.button, event.buttons, event.timestamp) == (PRESS, 7, (7,), 1.0)
+    assert decoder.held == 0x0100
+    # held without a new edge, then released
+    assert decoder.update(0x0100, 1.1) == []
+    assert decoder.update(0, 1.2) == []
+    assert decoder.held == 0
+    assert decoder.update(0x8000, 1.3)[0].button == 0
+
+
+def test_chord():
+    decoder = InputDecoder(8)
+    event, = decoder.update(0b10000101, 0.0)
+    assert (event.kind, event.button, event.buttons) == (CHORD, None, (0, 5, 7))
+    assert button_indexes(0b10000101, 8) == (0, 5, 7)
+
+
+def test_buttons_added_while_held_are_ignored():
+    decoder = InputDecoder(8)
+    assert kinds(decoder.update(0x80, 0.0)) == [PRESS]
+    assert decoder.update(0xc0, 0.1) == []
+    assert decoder.held == 0x80
+
+
+def test_long_press_and_repeat():
+    decoder = InputDecoder(8, long_press=0.8, repeat_interval=0.25)
+    decoder.update(0x01, 0.0)
+    assert decoder.tick(0.79) is None
+    long_press = decoder.tick(0.8)
+    assert (long_press.kind, long_press.button, long_press.timestamp) == (LONG_PRESS, 7, 0.8)
+    assert decoder.tick(0.9) is None
+    assert kinds(decoder.update(0x01, 1.05)) == [REPEAT]
+    assert decoder.tick(1.3).kind == REPEAT
+    # a late tick sends one repeat, not a burst
+    assert decoder.tick(5.0).kind == REPEAT
+    assert decoder.tick(5.1) is None
+    decoder.update(0, 5.2)
+    assert decoder.tick(10.0) is None
+
+
+def test_chord_long_press():
+    decoder = InputDecoder(8, long_press=0.5)
+    decoder.update(0x81, 0.0)
+    event = decoder.tick(0.5)
+    assert (event.kind, event.mask, event.buttons) == (LONG_PRESS, 0x81, (0, 7))
+
+
+def test_full_ring_drops_events():
+    mask = 0
+    scanner = KeyScanner(lambda: mask, debounce=0, capacity=1)
+    for now, mask in enumerate([0x80, 0, 0x40, 0]):
+        scanner.scan(float(now))
+    assert len(scanner.events) == 1
+    assert scanner.events.dropped == 3
+
+    # draining the ring alone leaves the decoder on the press whose release was dropped
+    decoder = InputDecoder(8, long_press=0.5)
+    events = []
+    key_event = scanner.events.pop()
+    while key_event is not None:
+        events += decoder.update(key_event.mask, key_event.timestamp)
+        key_event = scanner.events.pop()
+    assert kinds(events) == [PRESS]
+    assert decoder.held == 0x80
+    assert decoder.tick(10.0).kind == LONG_PRESS
+
+
+def test_game_recovers_from_dropped_release():
+    seg_game = SevenSegButtonGame(0, 0, 0, device=VirtualTMBoards())
+    mask = 0
+    scanner = KeyScanner(lambda: mask, debounce=0, capacity=1)
+    seg_game.tm.key_scanner = scanner
+    for now, mask in enumerate([0x80, 0]):
+        scanner.scan(float(now))
+    assert scanner.events.dropped == 1
+
+    event = seg_game._next_input_event()
+    assert (event.kind, event.button) == (PRESS, 0)
+    assert seg_game.input_decoder.held == 0
+    assert seg_game._next_input_event() is None
+
+    # the next press is decoded again
+    mask = 0x01
+    scanner.scan(2.0)
+    assert seg_game._next_input_event().button == 7
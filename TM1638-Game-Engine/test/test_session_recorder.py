@@ -0,0 +1,152 @@
+import io
+import time
+
+import pytest
+
+from tm1638_game_engine.frame_scheduler import pause
+from tm1638_game_engine.seg_game_engine import MiniGame, SevenSegButtonGame
+from tm1638_game_engine.session_recorder import FRAME, HEADER, INPUT, SessionRecorder, SessionReplayer, read_session
+from tm1638_game_engine.virtual_tm1638 import VirtualTMBoards
+
+
+def record_session(num_boards: int = 2) -> bytes:
+    stb = tuple(range(num_boards))
+    seg_game = SevenSegButtonGame(0, 0, stb, device=VirtualTMBoards(stb=stb))
+    log = io.BytesIO()
+    recorder = SessionRecorder(log, seed=1234)
+    recorder.attach(seg_game)
+    first_button = 1 << 8 * num_boards - 1
+    recorder.record_input(first_button)
+    recorder.record_input(first_button)  # unchanged, only counted as a read
+    recorder.record_frame(bytes(range(16 * num_boards)))
+    recorder.record_input(0)
+    recorder.record_frame(bytes(16 * num_boards), animation=True)
+    recorder.close()
+    return log.getvalue()
+
+
+def test_round_trip():
+    seed, num_boards, start_time, records = read_session(io.BytesIO(record_session()))
+    assert seed == 1234
+    assert num_boards == 2
+    assert start_time > 0
+    assert [(record.kind, record.animation, record.value) for record in records] == [
+        (INPUT, False, 0x8000),
+        (FRAME, False, bytes(range(32))),
+        (INPUT, False, 0),
+        (FRAME, True, bytes(32)),
+    ]
+    assert [record.idle_reads for record in records if record.kind == INPUT] == [1, 2]
+    times = [record.time for record in records]
+    assert times == sorted(times)
+
+
+def test_round_trip_file(tmp_path):
+    path = str(tmp_path / 'session.tmsr')
+    with open(path, 'wb') as file:
+        file.write(record_session(num_boards=1))
+    seed, num_boards, _, records = read_session(path)
+    assert (seed, num_boards, len(records)) == (1234, 1, 4)
+
+
+@pytest.mark.parametrize('data', [b'', b'TMSR', record_session()[:HEADER.size - 1]])
+def test_truncated_header(data):
+    with pytest.raises(ValueError, match='Not a session log'):
+        read_session(io.BytesIO(data))
+
+
+def test_corrupt_header():
+    data = bytearray(record_session())
+    data[:4] = b'XXXX'
+    with pytest.raises(ValueError, match='Not a session log'):
+        read_session(io.BytesIO(bytes(data)))
+
+    data = bytearray(record_session())
+    data[4] = 99
+    with pytest.raises(ValueError, match='version 99'):
+        read_session(io.BytesIO(bytes(data)))
+
+
+def test_truncated_records():
+    data = record_session()
+    # a header alone is an empty session
+    assert read_session(io.BytesIO(data[:HEADER.size]))[3] == []
+    for size in (HEADER.size + 3, len(data) - 1):
+        with pytest.raises(ValueError, match='truncated'):
+            read_session(io.BytesIO(data[:size]))
+
+
+def test_unknown_record_kind():
+    data = bytearray(record_session())
+    data[HEADER.size] = 0x7f
+    with pytest.raises(ValueError, match='Unknown record kind'):
+        read_session(io.BytesIO(bytes(data)))
+
+
+def make_game() -> SevenSegButtonGame:
+    seg_game = SevenSegButtonGame(0, 0, 0, device=VirtualTMBoards())
+
+    def setup_routine():
+        return {'correct_answer_conditions': [0, 1], 'game_seg_display': 'PLAY', 'intro_animation': pause(0.05)}
+
+    seg_game.register_game('test', lambda tm: MiniGame(2, tm, setup_routine=setup_routine, error_pause=0.2))
+    return seg_game
+
+
+def record_game(presses) -> bytes:
+    """
+    Records a game played by pressing (and releasing) the buttons of `presses` as soon as no animation plays
+    """
+    seg_game = make_game()
+    log = io.BytesIO()
+    recorder = SessionRecorder(log, seed=1)
+    recorder.attach(seg_game)
+    presses = list(presses)
+    held = 0
+
+    def read_buttons():
+        nonlocal held
+        if held or seg_game._animations or not presses:
+            held = 0
+        else:
+            held = presses.pop(0)
+        return held
+
+    seg_game.read_buttons = read_buttons
+    seg_game.select_game('test')
+    deadline = time.monotonic() + 30
+    while seg_game.selected_game.continue_loop and time.monotonic() < deadline:
+        if seg_game.in_standby:
+            seg_game.standby_start_loop()
+        else:
+            seg_game.game_loop()
+    recorder.close()
+    return log.getvalue()
+
+
+@pytest.fixture(scope='module')
+def game_log() -> bytes:
+    standby = make_game().standby_button
+    return record_game([standby, standby, 0x01, 0x80, 0x40])
+
+
+def test_replay_press_right_after_animation(game_log):
+    log = game_log
+    # the first answer is read as soon as the intro has ended, with no idle read
+    game_inputs = [record for record in read_session(io.BytesIO(log))[3] if record.kind == INPUT][4:]
+    assert (game_inputs[0].value, game_inputs[0].animation, game_inputs[0].idle_reads) == (0x01, False, 0)
+
+    for real_time in (False, True):
+        result = SessionReplayer(io.BytesIO(log)).replay(make_game(), real_time=real_time)
+        assert result.matched, result
+
+
+def test_replay_at_maximum_speed_skips_the_waits(game_log):
+    log = game_log
+    recorded = read_session(io.BytesIO(log))[3][-1].time
+    seg_game = make_game()
+    result = SessionReplayer(io.BytesIO(log)).replay(seg_game)
+    assert result.matched, result
+    # the roll, the pauses and the error pause of the session are not waited for
+    assert result.duration < recorded / 4
+    assert seg_game.selected_game.sleep is time.sleep
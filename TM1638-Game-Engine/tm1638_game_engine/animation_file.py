@@ -0,0 +1,138 @@
+"""
+Binary animation files, played straight from the file (see TM1638Animated.play_file).
+
+An animation file holds the precomputed frames of an animation for a board geometry. AnimationFile maps the file in
+memory: its frames are memoryview slices of the mapping, written to the display without being copied into Python
+objects, so a library of large animations costs next to no RAM until the frames are shown.
+
+File format (little endian):
+    header: magic b'TMAF', version (B), number of boards (B), flags (B), pad byte, frame rate (f, frames per second),
+            number of frames (I)
+    frames: for each frame, one segment value per display (8 per board), then if the LEDS flag is set the LED states
+            as 1 byte per board (first LED = most significant bit of the first byte)
+
+The converter (convert_animations.py) writes the built-in animations (roll, wave, load, unload) to files.
+"""
+import mmap
+import os
+import struct
+from typing import BinaryIO, Optional, Union
+
+from .animation_frames import FrameSequence
+
+MAGIC: bytes = b'TMAF'
+VERSION: int = 1
+
+HEADER = struct.Struct('<4sBBBxfI')
+
+# header flags
+LEDS: int = 0x01
+
+
+def write_animation(file: Union[str, BinaryIO],
+                    frames: FrameSequence,
+                    speed: float,
+                    num_boards: int = 1) -> None:
+    """
+    Writes frames to an animation file
+
+    :param file: path or binary file to write to
+    :param frames: the frames (one segment value per display of the boards, and optionally the LED states)
+    :param speed: frame rate the animation is played at by default (frames per second)
+    :param num_boards: number of chained boards the frames are made for
+    """
+    assert frames.width == 8 * num_boards, \
+        f"Frames of {frames.width} displays do not fit {num_boards} board(s) of 8 displays"
+    flags = LEDS if frames.leds is not None else 0
+    data = bytearray(HEADER.pack(MAGIC, VERSION, num_boards, flags, speed, len(frames)))
+    for index, frame in enumerate(frames):
+        data += frame
+        if frames.leds is not None:
+            data += (frames.leds[index] & ((1 << 8 * num_boards) - 1)).to_bytes(num_boards, 'big')
+
+    if isinstance(file, str):
+        with open(file, 'wb') as out:
+            out.write(data)
+    else:
+        file.write(data)
+
+
+class _FileLeds:
+    """
+    LED state of each frame of an AnimationFile, read from the mapping when indexed
+    """
+    __slots__ = ('_animation',)
+
+    def __init__(self, animation: 'AnimationFile') -> None:
+        self._animation = animation
+
+    def __len__(self) -> int:
+        return len(self._animation)
+
+    def __getitem__(self, index: int) -> int:
+        animation = self._animation
+        start = animation._offset(index) + animation.width
+        return int.from_bytes(animation._view[start:start + animation.num_boards], 'big')
+
+
+class AnimationFile:
+    """
+    The frames of an animation file, mapped in memory. Indexing gives the segment values of a frame (a memoryview of
+    the mapping) and `leds` the LED states, like a FrameSequence, so that it can be played by
+    TM1638Animated.play_frames().
+    """
+    def __init__(self,
+                 path: str) -> None:
+        """
+        :param path: path of the animation file
+        """
+        self.path: str = path
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < HEADER.size:
+                raise ValueError(f"{path} is not an animation file")
+            self._map: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view: memoryview = memoryview(self._map)
+
+        magic, version, num_boards, flags, speed, num_frames = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} animation file")
+        self.num_boards: int = num_boards
+        self.width: int = 8 * num_boards
+        self.speed: float = speed
+        self.num_frames: int = num_frames
+        self._stride: int = self.width + (num_boards if flags & LEDS else 0)
+        self.leds: Optional[_FileLeds] = _FileLeds(self) if flags & LEDS else None
+
+        expected = HEADER.size + num_frames * self._stride
+        if size < expected:
+            self.close()
+            raise ValueError(f"{path} is truncated ({size} of {expected} bytes)")
+
+    def _offset(self, index: int) -> int:
+        if index < 0:
+            index += self.num_frames
+        if not 0 <= index < self.num_frames:
+            raise IndexError('frame index out of range')
+        return HEADER.size + index * self._stride
+
+    def __len__(self) -> int:
+        return self.num_frames
+
+    def __getitem__(self, index: int) -> memoryview:
+        start = self._offset(index)
+        return self._view[start:start + self.width]
+
+    def close(self) -> None:
+        """
+        Unmaps the file (the frames must no longer be in use)
+        """
+        self._view.release()
+        self._map.close()
+
+    def __enter__(self) -> 'AnimationFile':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
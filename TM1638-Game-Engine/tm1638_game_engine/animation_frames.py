@@ -0,0 +1,126 @@
+"""
+Precomputed frame sequences for the TM1638Animated animations.
+
+Each animation is built once per (animation, number of segments, parameters) and kept in a bounded cache, so
+playing an animation only copies ready-made segment values to the display.
+"""
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+
+class FrameSequence:
+    """
+    A sequence of display frames stored as one contiguous block of segment values (one byte per display), with
+    an optional LED state (integer, first LED = most significant bit) for each frame.
+    """
+    __slots__ = ('data', 'width', 'leds', '_view')
+
+    def __init__(self,
+                 data: bytes,
+                 width: int,
+                 leds: Optional[Sequence[int]] = None) -> None:
+        """
+        :param data: segment values of all frames, frame after frame
+        :param width: number of segment values per frame
+        :param leds: LED state of each frame (LEDs are left untouched if None)
+        """
+        assert len(data) % width == 0, f"Frame data of {len(data)} bytes cannot be split in frames of {width}"
+        self.data: bytes = bytes(data)
+        self.width: int = width
+        self.leds: Optional[Tuple[int, ...]] = None if leds is None else tuple(leds)
+        self._view: memoryview = memoryview(self.data)
+        assert self.leds is None or len(self.leds) == len(self), "One LED state is required for each frame"
+
+    def __len__(self) -> int:
+        return len(self.data) // self.width
+
+    def __getitem__(self, index: int) -> memoryview:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('frame index out of range')
+        return self._view[index * self.width:(index + 1) * self.width]
+
+    def __iter__(self) -> Iterator[memoryview]:
+        width = self.width
+        view = self._view
+        for start in range(0, len(self.data), width):
+            yield view[start:start + width]
+
+
+# segments a to f, lit in turn by the roll and wave animations
+_OUTER_SEGMENTS: int = 6
+
+_builders: Dict[str, Callable[..., bytes]] = {}
+
+
+def frame_builder(name: str) -> Callable:
+    """
+    Registers a function building the segment values of an animation.
+    The function takes the number of segments followed by the animation parameters and returns the frame data.
+
+    :param name: name the animation is requested by in animation_frames()
+    """
+    def register(func: Callable[..., bytes]) -> Callable[..., bytes]:
+        _builders[name] = func
+        return func
+    return register
+
+
+@lru_cache(maxsize=32)
+def animation_frames(name: str,
+                     num_segments: int,
+                     *params) -> FrameSequence:
+    """
+    Returns the (cached) frames of an animation.
+
+    :param name: name of a registered animation
+    :param num_segments: number of segment displays the frames are built for
+    :param params: parameters of the animation
+    """
+    return FrameSequence(_builders[name](num_segments, *params), num_segments)
+
+
+@frame_builder('roll')
+def _roll(num_segments: int,
+          rolls: int) -> bytes:
+    """
+    Each display lights its outer segments one after the other
+    """
+    one_roll = b''.join([bytes([1 << bit]) * num_segments for bit in range(_OUTER_SEGMENTS)])
+    return one_roll * rolls
+
+
+@frame_builder('wave')
+def _wave(num_segments: int,
+          waves: int) -> bytes:
+    """
+    The outer segments light in a wave travelling across all the displays
+    """
+    def shift(step: int) -> int:
+        # the frames of the original 8-display wave, whose last display lights the middle segment on the last place
+        if step < _OUTER_SEGMENTS:
+            return step
+        if step <= 2 * _OUTER_SEGMENTS:
+            return step - _OUTER_SEGMENTS
+        return step % _OUTER_SEGMENTS
+
+    one_wave = b''.join([bytes([1 << shift(pos + place) for pos in range(num_segments)])
+                         for place in range(_OUTER_SEGMENTS)])
+    return one_wave * waves
+
+
+@frame_builder('load')
+def _load(num_segments: int) -> bytes:
+    """
+    Dots fill up from the left
+    """
+    return b''.join([(b'\x80' * pos).ljust(num_segments, b'\0') for pos in range(num_segments)])
+
+
+@frame_builder('unload')
+def _unload(num_segments: int) -> bytes:
+    """
+    Dots empty from the right
+    """
+    return b''.join([(b'\x80' * pos).ljust(num_segments, b'\0') for pos in range(num_segments, -1, -1)])
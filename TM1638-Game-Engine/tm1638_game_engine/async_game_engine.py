@@ -0,0 +1,123 @@
+"""
+asyncio variant of the 7-segment button game
+
+Copyright (C) 2024  James Kano
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+The whole game runs as one event loop task: input polling, animation frames and MiniGame callbacks share the event
+loop, which sleeps between polls and frame deadlines instead of spinning.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from .input_decoder import InputEvent
+from .seg_game_engine import SevenSegButtonGame
+
+
+class AsyncSevenSegButtonGame(SevenSegButtonGame):
+    def __init__(self,
+                 stb: int,
+                 clk: int,
+                 dio: int,
+                 test_mode: bool = False,
+                 poll_interval: float = 0.05,
+                 device: Optional[object] = None,
+                 key_scan_rate: Optional[float] = None,
+                 pregenerate_puzzles: int = 1) -> None:
+        """
+        7-segment button game driven by asyncio
+
+        MiniGame callbacks may be coroutine functions (they are awaited through MiniGame.play_async()).
+
+        :param stb: Specifies the stb pin number
+        :param clk: Specifies the clk pin number
+        :param dio: Specifies the dio pin number
+        :param poll_interval: Seconds between button reads (replaces the pause of check_button_values)
+        :param device: driver used instead of the rpi_TM1638 boards (e.g. VirtualTMBoards for headless runs)
+        :param key_scan_rate: if given, the buttons are read by a background key scan at this rate (reads per second)
+            and the run loop only drains its events
+        :param pregenerate_puzzles: number of puzzles generated ahead for each game (see SevenSegButtonGame)
+        """
+        super().__init__(stb=stb,
+                         clk=clk,
+                         dio=dio,
+                         test_mode=test_mode,
+                         key_scan_rate=key_scan_rate,
+                         device=device,
+                         pregenerate_puzzles=pregenerate_puzzles)
+        self.poll_interval: float = poll_interval
+
+    async def _next_input_event_async(self) -> Optional[InputEvent]:
+        """
+        Async counterpart of _next_input_event(): reads the buttons without pausing (the pause between reads is
+        awaited by the run loop) on an executor thread, so that the bus transaction does not block the event loop,
+        or drains the key scan events if it is running.
+
+        :return: the next InputEvent or None
+        """
+        if self._input_events or self.tm.key_scanner is not None:
+            # no read needed
+            return self._next_input_event()
+        read_buttons = self.read_buttons or self.tm.read_button_values
+        mask = await asyncio.get_running_loop().run_in_executor(None, read_buttons)
+        return self._next_input_event(lambda: mask)
+
+    async def standby_start_loop_async(self) -> None:
+        """
+        Async counterpart of standby_start_loop()
+        """
+        with self.tm.tick():
+            self._standby_turn(self._press_mask(await self._next_input_event_async()))
+
+    async def game_loop_async(self) -> None:
+        """
+        Async counterpart of game_loop(), awaiting the MiniGame turn
+        """
+        assert self._setup_run, "Please call setup() from the main file before entering the loop"
+
+        with self.tm.tick():
+            event = await self._next_input_event_async()
+            if self._prepare_turn(event):
+                await self.selected_game.play_async(event)
+
+    def _time_to_next_tick(self) -> float:
+        """
+        Seconds until the next button read or animation frame is due, whichever is sooner
+        """
+        wait = self.poll_interval
+        if self._animations:
+            frame_wait = self._animations[0].next_deadline - time.monotonic()
+            wait = min(wait, max(0.0, frame_wait))
+        return wait
+
+    async def run(self,
+                  selected_game_name: Optional[str] = None) -> None:
+        """
+        Selects a game and plays it to the end (the async form of the run_tm1638_games() loop)
+
+        :param selected_game_name: Enables a specific game to be selected and played
+        """
+        self.select_game(selected_game_name)
+
+        while self.selected_game.continue_loop:
+            if self.in_standby:
+                await self.standby_start_loop_async()
+            else:
+                await self.game_loop_async()
+            await asyncio.sleep(self._time_to_next_tick())
+
+        await asyncio.sleep(2)
+        self.tm.clear_display()
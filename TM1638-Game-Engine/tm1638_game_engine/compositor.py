@@ -0,0 +1,117 @@
+"""
+Layered composition of the display frames (see TM1638Animated).
+
+Every write of TM1638Animated goes to a layer rather than to the boards: the game screen, the button feedback, overlay
+messages and the animation frames each have their own layer, and the layers are merged into the frame sent to the
+boards on commit. A layer only covers the segments and LEDs it has written (its masks), so the feedback LEDs of a
+button press no longer wipe the LEDs of the game, and an animation playing over part of the displays leaves the rest
+of the game screen visible.
+
+Layers, from bottom to top:
+    'game'      - the game screens (the default layer of the writes)
+    'feedback'  - the LEDs lit by the button presses
+    'overlay'   - messages shown over the game
+    'animation' - the animation frames (blit_frame), uncovered when an animation ends
+
+Merging is done with bitwise operations on the whole chain at once: the segment values and masks of a layer are read
+as one integer (one byte per display), so a merge is a handful of integer operations whatever the number of boards.
+"""
+from typing import Dict, Optional, Sequence, Tuple
+
+LAYERS: Tuple[str, ...] = ('game', 'feedback', 'overlay', 'animation')
+
+
+class Layer:
+    """
+    Segment values and LED states of one layer, with the masks of the segments and LEDs it covers
+    """
+    __slots__ = ('name', 'segments', 'segment_mask', 'leds', 'led_mask')
+
+    def __init__(self,
+                 name: str,
+                 num_segments: int) -> None:
+        """
+        :param name: name of the layer
+        :param num_segments: number of 7-segment displays
+        """
+        self.name: str = name
+        self.segments: bytearray = bytearray(num_segments)
+        # segments (bits of each display) covered by the layer
+        self.segment_mask: bytearray = bytearray(num_segments)
+        self.leds: int = 0
+        # LEDs covered by the layer (first LED = most significant bit)
+        self.led_mask: int = 0
+
+    def set_segment_bytes(self,
+                          data: bytes,
+                          start: int = 0,
+                          mask: Optional[bytes] = None) -> None:
+        """
+        Writes segment values, covering the displays written
+
+        :param data: segment values (bit 0 = top segment ... bit 6 = middle segment, bit 7 = dot)
+        :param start: index of the first 7-segment display to be written
+        :param mask: segments of each display covered (whole displays by default)
+        """
+        stop = start + len(data)
+        self.segments[start:stop] = data
+        self.segment_mask[start:stop] = mask if mask is not None else b'\xff' * len(data)
+
+    def set_leds(self,
+                 value: int,
+                 mask: int) -> None:
+        """
+        Writes LED states, covering the LEDs of the mask
+
+        :param value: integer of the LEDs to be lit
+        :param mask: integer of the LEDs written
+        """
+        self.leds = (self.leds & ~mask) | (value & mask)
+        self.led_mask |= mask
+
+    def clear(self) -> None:
+        """
+        Uncovers the whole layer
+        """
+        self.segments[:] = self.segment_mask[:] = bytes(len(self.segments))
+        self.leds = self.led_mask = 0
+
+
+class Compositor:
+    """
+    The layers of a display, merged into one frame
+    """
+    def __init__(self,
+                 num_segments: int,
+                 names: Sequence[str] = LAYERS) -> None:
+        """
+        :param num_segments: number of 7-segment displays
+        :param names: names of the layers, from bottom to top
+        """
+        self.num_segments: int = num_segments
+        self.layers: Dict[str, Layer] = {name: Layer(name, num_segments) for name in names}
+        # layer written by TM1638Animated (see TM1638Animated.layer())
+        self.target: Layer = next(iter(self.layers.values()))
+
+    def compose(self) -> Tuple[bytes, int]:
+        """
+        Merges the layers, each one covering the layers below it where its masks are set
+
+        :return: the segment values of the displays and the integer of the lit LEDs
+        """
+        segments = 0
+        leds = 0
+        for layer in self.layers.values():
+            if layer.led_mask:
+                leds = (leds & ~layer.led_mask) | (layer.leds & layer.led_mask)
+            mask = int.from_bytes(layer.segment_mask, 'big')
+            if mask:
+                segments = (segments & ~mask) | (int.from_bytes(layer.segments, 'big') & mask)
+        return segments.to_bytes(self.num_segments, 'big'), leds
+
+    def clear(self) -> None:
+        """
+        Uncovers every layer
+        """
+        for layer in self.layers.values():
+            layer.clear()
@@ -1,34 +1,166 @@
 """
 Decorators used to add intermediary or inverse-specification style testing to functions
+
+A method decorated with testing_wrapper is resolved once per instance: the first access picks the production
+method (the undecorated function) or the test implementation according to the instance's test mode, and stores the
+chosen bound method in the instance __dict__ under the method's name. The decorator is a non-data descriptor, so the
+stored method shadows it and later calls are plain bound method calls, without any wrapper or descriptor lookup.
+The stored methods refer to their instance (a reference cycle, freed by the garbage collector).
+The choice is only kept when the class declares its test mode attribute as a TestModeAttribute, which drops the
+stored methods whenever the test mode changes (for other classes the choice is made on every access).
+
+Test-mode calls are recorded as TraceEvents in a bounded ring buffer (see trace_events()), and the test message is
+echoed to stdout while `echo` is True.
 """
 
 import functools
+import time
+from collections import deque
+from typing import Any, Callable, Deque, List, NamedTuple, Optional, Tuple
+
+# print the test messages as well as recording them
+echo: bool = True
+
+
+class TraceEvent(NamedTuple):
+    """
+    A call of a decorated method in test mode
+    """
+    method: str  # qualified name of the method
+    message: str  # the test message of the method
+    args: tuple
+    kwargs: dict
+    timestamp: float  # monotonic time of the call
+
+
+# most recent test-mode calls
+trace: Deque[TraceEvent] = deque(maxlen=256)
+
+
+def trace_events(method: Optional[str] = None) -> List[TraceEvent]:
+    """
+    Returns the recorded test-mode calls, oldest first
+
+    :param method: if given, only the calls of methods with this name (or qualified name) are returned
+    """
+    if method is None:
+        return list(trace)
+    return [event for event in trace if event.method == method or event.method.endswith(f'.{method}')]
+
+
+def clear_trace() -> None:
+    """
+    Forgets the recorded test-mode calls
+    """
+    trace.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _testing_methods(cls: type,
+                     test_mode_attr: str) -> Tuple[str, ...]:
+    """
+    Names of the methods of a class decorated with testing_wrapper and depending on a test mode attribute
+    """
+    names = set()
+    for klass in cls.__mro__:
+        for name, value in vars(klass).items():
+            if isinstance(value, _TestingMethod) and value.test_mode_attr == test_mode_attr:
+                names.add(name)
+    return tuple(names)
+
+
+class TestModeAttribute:
+    """
+    Data descriptor for the test mode flag of a class using testing_wrapper. Setting the flag drops the
+    methods chosen by the instance's decorated methods, so that they are chosen again on next access.
+    """
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = name
+
+    def __get__(self, obj, owner=None) -> Any:
+        if obj is None:
+            return self
+        return obj.__dict__.get(self.name, False)
+
+    def __set__(self, obj, value: Any) -> None:
+        obj.__dict__[self.name] = value
+        for name in _testing_methods(type(obj), self.name):
+            obj.__dict__.pop(name, None)
+
+
+class _TestingMethod:
+    """
+    Non-data descriptor choosing between a method and its test implementation (see testing_wrapper)
+    """
+    def __init__(self,
+                 func: Callable,
+                 message: str,
+                 test_and_run: bool,
+                 test_mode_attr: str,
+                 trace_name: Optional[str] = None) -> None:
+        self.func = func
+        self.message = message
+        self.test_and_run = test_and_run
+        self.test_mode_attr = test_mode_attr
+        self.trace_name = trace_name
+        self.name = func.__name__
+        self.test_func = self._make_test_func()
+        functools.update_wrapper(self, func)
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = name
+
+    def _make_test_func(self) -> Callable:
+        func = self.func
+        message = self.message
+        test_and_run = self.test_and_run
+        method = func.__qualname__
+        if self.trace_name is not None:
+            method = f'{method.rpartition(".")[0]}.{self.trace_name}'.lstrip('.')
+
+        @functools.wraps(func)
+        def test_func(self_obj, *args, **kwargs):
+            # obj is substitution for self
+            trace.append(TraceEvent(method, message, args, kwargs, time.monotonic()))
+            if echo:
+                # printed below the display renderings (only loaded in test mode)
+                from .display_mocks import print_message
+
+                print_message(message)
+                if args or kwargs:
+                    print_message(f'args: {args}, kwargs: {kwargs}')
+            if test_and_run:
+                return func(self_obj, *args, **kwargs)
+
+        return test_func
+
+    def __get__(self, obj, owner=None) -> Callable:
+        if obj is None:
+            return self
+        func = self.test_func if getattr(obj, self.test_mode_attr) else self.func
+        method = func.__get__(obj, owner)
+        # keep the choice for the instance if a TestModeAttribute is there to drop it when the mode changes: the
+        # bound method stored under the method's name shadows this descriptor
+        if isinstance(getattr(type(obj), self.test_mode_attr, None), TestModeAttribute):
+            obj.__dict__[self.name] = method
+        return method
+
 
 def testing_wrapper(message,
                     test_and_run = False,
-                    test_mode_attr = 'test_mode'):
+                    test_mode_attr = 'test_mode',
+                    trace_name = None):
     """
     Prints a testing message and may / may not run the function as desired.
 
-    DESIGNED FOR CLASS FUNCTIONS (hence use of self_obj for self passthrough)
+    DESIGNED FOR CLASS FUNCTIONS (the implementation is chosen per instance, see the module docstring)
 
     :param message: the test message to be printed.
     :param test_and_run: defaults to False. if True, the wrapper will pring the tests statement AND execute the
         function passed in.
+    :param test_mode_attr: name of the instance attribute holding the test mode
+    :param trace_name: name of the method the calls are traced as (e.g. the public method calling a private one)
     """
     def testing_wrapper_decorator(func):
-        @functools.wraps(func)
-        def print_test_message(self_obj, *args, **kwargs):
-            # obj is substitution for self
-
-            if getattr(self_obj, test_mode_attr):
-                print(message)
-                if args or kwargs:
-                    print(f'args: {args}, kwargs: {kwargs}')
-                if test_and_run:
-                    return func(self_obj, *args, **kwargs)
-            else:
-                return func(self_obj, *args, **kwargs)
-            
-        return print_test_message
+        return _TestingMethod(func, message, test_and_run, test_mode_attr, trace_name)
     return testing_wrapper_decorator
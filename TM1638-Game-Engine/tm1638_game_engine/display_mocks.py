@@ -15,9 +15,15 @@ Appearance of rendered display:
 The printed (rendered) version shows bold red for illuminated and grey for off. Lit LEDs appear as a red star.
 For colour-blindness accessibility, please comment out font.on and uncomment the alternative font.on for blue.
 
+For continuous output (e.g. animations), TerminalRenderer keeps a single rendering up to date in place.
+
 """
-from typing import Dict, List, Optional
-from copy import deepcopy
+import sys
+import time
+import weakref
+from typing import Callable, List, Optional, TextIO, Tuple
+
+from .seg_font import encode_line
 
 
 class font:
@@ -43,7 +49,25 @@ def colour_off(off_str: str) -> str:
         Wraps a given string in off colouring (then returns to black)
         """
         return f"{font.off}{off_str}{font.black}"
-    
+
+
+def _render_seg_cell(value: int) -> Tuple[str, str, str]:
+    """
+    Renders the top, middle and bottom rows (4 columns each) of a 7-segment display showing a segment value
+    """
+    # Segment element orders (bit 7 first):
+    #               [dot,  m,   tl,  bl,  b,   br,  tr,  t]
+    element_chars = ['.', '_', '|', '|', '_', '|', '|', '_',]
+    elements = [colour_on(char) if value & (0x80 >> pos) else colour_off(char)
+                for pos, char in enumerate(element_chars)]
+    return (f' {elements[7]}  ',
+            f'{elements[2]}{elements[1]}{elements[6]} ',
+            f'{elements[3]}{elements[4]}{elements[5]}{elements[0]}')
+
+
+# pre-rendered display cells: rows of every segment value, and the off / on LED
+SEG_CELLS: Tuple[Tuple[str, str, str], ...] = tuple(_render_seg_cell(value) for value in range(256))
+LED_CELLS: Tuple[str, str] = (colour_off(' •  '), colour_on(' *  '))
 
     
 class seg_mock:
@@ -55,17 +79,6 @@ class seg_mock:
         
         self.num_segs: int = num_segs
         self.display_bytes: List[int]
-        self._ints: List[int] = [63, 6, 91, 79, 102, 109, 125, 7, 127, 111]
-        self._chars: Dict[str, int] = {'-': 64,
-                                       '_': 8,
-                                       ' ': 0,
-                                       'a': 119,
-                                       'e': 121,
-                                       'f': 113,
-                                       'o': 92,
-                                       'r': 80,
-                                       's': 109}
-        self._dot: int = 128
         
         
     def print_segs(self,
@@ -73,108 +86,12 @@ class seg_mock:
         """
         The printing function to represent a single segment
         """
-        if isinstance(_input, list):
-            try:
-                inputs = ''.join(_input)
-            except:
-                # list of ints provided
-                inputs = deepcopy(_input)
-        else:
-            inputs = str(_input)
-            
-        # Detect the input mode (mappable character, mappable number, raw displayable bytes)
-        input_modes = []
-        for item in inputs:
-            try:
-                item = int(item)
-                if item < len(self._ints):
-                    input_modes.append('number')
-                else:
-                    input_modes.append('bytes')
-            except:
-                if item.lower() in self._chars:
-                    input_modes.append('string')
-                else:
-                    raise Exception(f'Unsupported character passed in input: {item}')
-                    
-                    
-        input_mode = 'bytes'
-        if 'bytes' not in input_modes:
-            if 'string' in input_modes:
-                input_mode = 'string'
-            else:
-                input_mode = 'number'
-                        
-                        
-        
-        assert len(inputs) <= self.num_segs, f'Input cannot be longer than {self.num_segs}'
-        # render any unused segments
-        if len(inputs) < self.num_segs:
-            if input_mode == 'bytes':
-                while len(inputs) < self.num_segs:
-                    inputs.append(0)
-            else:
-                inputs += ' ' * (self.num_segs - len(inputs))
-        
-            
-        # Segment element orders:
-        #               [dot,  m,   tl,  bl,  b,   br,  tr,  t]
-        element_chars = ['.', '_', '|', '|', '_', '|', '|', '_',]            
-            
-        tops = []
-        mids = []
-        bottoms = []
-        
-        input_i = 0
-        
-        while input_i < len(inputs):
-            
-            # Cycle through individual characters and render
-            if input_mode == 'number':
-                input_int = int(inputs[input_i])
-                input_int = self._ints[input_int]
-            elif input_mode == 'string':
-                # Can be alphanumeric
-                try:
-                    input_int = int(inputs[input_i])
-                    input_int = self._ints[input_int]
-                except:
-                    input_int = self._chars[inputs[input_i].lower()]
-            else:
-                # Input must be displayed as a raw byte (unmapped value)
-                input_int = int(inputs[input_i])
-                
-            # Handle the dot if provided
-            if input_i+1 < len(inputs):
-                if inputs[input_i+1] == '.':
-                    input_int += self._dot
-                    input_i += 1
-            
-            # Convert to binary byte from binary values
-            input_byte_str = str(format(input_int, '08b'))
-                        
-            # Covent the byte into individual lights (elements on/off)
-            display_elements = []
-            i_val = 0
-            for val in input_byte_str:
-                val = int(val)
-                if val:
-                    display_elements.append(colour_on(element_chars[i_val]))
-                else:
-                    display_elements.append(colour_off(element_chars[i_val]))
-                i_val += 1
-            
-            
-            tops.append(f' {display_elements[7]}  ')
-            mids.append(f'{display_elements[2]}{display_elements[1]}{display_elements[6]} ')
-            bottoms.append(f'{display_elements[3]}{display_elements[4]}{display_elements[5]}{display_elements[0]}')
-        
-            input_i += 1
-        
-                                
-        print("".join(tops))
-        print("".join(mids))
-        print("".join(bottoms))
+        # Characters are mapped by the shared font, lists of ints are displayed as raw (unmapped) bytes
+        display_bytes = encode_line(_input, self.num_segs)
+        assert len(display_bytes) <= self.num_segs, f'Input cannot be longer than {self.num_segs}'
+
+        cells = [SEG_CELLS[value] for value in display_bytes]
+        print("\n".join("".join(cell[row] for cell in cells) for row in range(3)))
 
 
 
@@ -193,12 +110,7 @@ class led_mock:
         """
         Prints the LEDs as a binary representation of an integer
         """
-        bin_format = f"0{self.num_leds}b"
-        bin_str = str(format(value, bin_format))
-        test_print_list = [colour_on(' *  ') if digit == '1' 
-                           else colour_off(' •  ') 
-                           for digit in bin_str]
-        print("".join(test_print_list))
+        print("".join([LED_CELLS[value >> (self.num_leds - 1 - i) & 1] for i in range(self.num_leds)]))
     
     
     def print_val_from_left(self,
@@ -206,11 +118,157 @@ class led_mock:
         """
         Prints the number as number of LEDs lit
         """
-        test_print_list = [colour_on(' *  ') if i < value
-                           else colour_off(' •  ')
-                           for i in range(self.num_leds)]
-        print("".join(test_print_list))
+        print("".join([LED_CELLS[i < value] for i in range(self.num_leds)]))
         
     
         
-    
\ No newline at end of file
+    
+
+# the renderers created, so that messages printed to their stream can be drawn below them (see print_message())
+_renderers: 'weakref.WeakSet[TerminalRenderer]' = weakref.WeakSet()
+
+
+def print_message(message: str) -> None:
+    """
+    Prints a message to stdout below the renderings (the test-mode messages), the renderers drawing to stdout
+    drawing their next frame as a new block below the message
+    """
+    print(message)
+    for renderer in list(_renderers):
+        if renderer.stream is sys.stdout:
+            renderer.invalidate()
+
+
+class TerminalRenderer:
+    """
+    Persistent terminal rendering of the display (LED row above the 7-segment rows), fed with the register image of
+    the boards (segment values at even addresses, LEDs at odd addresses).
+
+    On a terminal the display is drawn once and then only the cells that changed are redrawn in place (cursor
+    addressing), with a single write per frame. Frames arriving faster than max_fps are coalesced: the latest frame
+    is kept and drawn by the next render() or tick() once the refresh interval has passed, or by flush(). When the
+    output is not a terminal every drawn frame is appended as a whole block.
+
+    NOTE: anything else printed to the stream moves the cursor away from the display; print it with print_message()
+    (or call invalidate() afterwards) so that the next frame is drawn as a new block.
+    """
+    def __init__(self,
+                 num_segs: int = 8,
+                 max_fps: float = 30,
+                 stream: Optional[TextIO] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param num_segs: number of 7-segment displays (and LEDs)
+        :param max_fps: maximum number of frames drawn per second (0 for no limit)
+        :param stream: output stream, sys.stdout by default
+        :param clock: time source of the refresh rate limit
+        """
+        self.num_segs: int = num_segs
+        self.max_fps: float = max_fps
+        self.stream: TextIO = stream if stream is not None else sys.stdout
+        self.frames_drawn: int = 0
+        self.frames_skipped: int = 0
+
+        self._clock: Callable[[], float] = clock
+        self._in_place: bool = self.stream.isatty()
+        self._shown: Optional[bytearray] = None
+        self._pending: Optional[bytes] = None
+        self._next_draw: float = 0.0
+        _renderers.add(self)
+
+    def render(self,
+               image: bytes) -> bool:
+        """
+        Displays a register image (rate limited to max_fps)
+
+        :param image: 16 register values per board
+        :return: True if the frame was drawn now, False if it has been kept to be drawn later
+        """
+        now = self._clock()
+        if now < self._next_draw:
+            if self._pending is not None:
+                self.frames_skipped += 1
+            self._pending = bytes(image)
+            return False
+
+        self._pending = None
+        self._draw(image)
+        if self.max_fps:
+            self._next_draw = now + 1 / self.max_fps
+        return True
+
+    def tick(self) -> bool:
+        """
+        Draws the frame held back by the refresh rate limit once the refresh interval has passed (to be called
+        periodically when no new frame may arrive)
+
+        :return: True if a frame was drawn
+        """
+        if self._pending is None:
+            return False
+        image, self._pending = self._pending, None
+        return self.render(image)
+
+    def flush(self) -> None:
+        """
+        Draws the frame held back by the refresh rate limit, if any
+        """
+        if self._pending is not None:
+            image, self._pending = self._pending, None
+            self._draw(image)
+
+    def invalidate(self) -> None:
+        """
+        Forgets what has been drawn, the next frame is drawn in full below the current output
+        """
+        self._shown = None
+
+    def _draw(self, image: bytes) -> None:
+        """
+        Writes a frame (the changed cells only when drawing in place)
+        """
+        image = image[:2 * self.num_segs]
+        shown = self._shown
+        if shown is None or not self._in_place:
+            out = self._block(image)
+        else:
+            out = self._changes(shown, image)
+            if not out:
+                return
+        self.stream.write(out)
+        self.stream.flush()
+        self._shown = bytearray(image)
+        self.frames_drawn += 1
+
+    def _block(self, image: bytes) -> str:
+        """
+        The whole display as 4 lines
+        """
+        cells = [SEG_CELLS[value] for value in image[0::2]]
+        rows = ["".join([LED_CELLS[led & 1] for led in image[1::2]])]
+        rows.extend("".join([cell[row] for cell in cells]) for row in range(3))
+        return "\n".join(rows) + "\n"
+
+    def _changes(self,
+                 shown: bytearray,
+                 image: bytes) -> str:
+        """
+        Cursor movements and cells redrawing the changed registers. The cursor is left at the start of the line
+        below the display, where the block drawing leaves it.
+        """
+        out = []
+        for register, value in enumerate(image):
+            if value == shown[register]:
+                continue
+            column = 4 * (register >> 1) + 1
+            if register & 1:
+                # LED row: 4 lines up
+                out.append(f'\x1b[4A\x1b[{column}G{LED_CELLS[value & 1]}\x1b[4B')
+            else:
+                top, mid, bottom = SEG_CELLS[value]
+                out.append(f'\x1b[3A\x1b[{column}G{top}'
+                           f'\x1b[1B\x1b[{column}G{mid}'
+                           f'\x1b[1B\x1b[{column}G{bottom}\x1b[1B')
+        if out:
+            out.append('\r')
+        return "".join(out)
@@ -0,0 +1,237 @@
+"""
+Drift-free frame pacing for animations.
+
+Frames are shown against absolute deadlines on the monotonic clock (frame k is due at start + k / speed), so the
+time spent drawing a frame does not add up over the animation. When playback falls behind, the frames that were
+missed are skipped instead of slowing the whole animation down.
+
+An Animation wraps a scheduler so that a playback can either run to completion (blocking) or be advanced one step at
+a time from a game loop that keeps polling its input in between.
+"""
+import time
+from typing import Any, Callable, Optional
+
+from . import instrumentation
+
+
+class FrameStats:
+    """
+    Timing statistics of an animation, accumulated over all of its playbacks.
+    """
+    def __init__(self) -> None:
+        self.playbacks: int = 0
+        self.frames: int = 0
+        self.dropped: int = 0
+        self.overruns: int = 0
+        self.total_jitter: float = 0.0
+        self.max_jitter: float = 0.0
+
+    @property
+    def mean_jitter(self) -> float:
+        """
+        Mean lateness of the shown frames in seconds
+        """
+        return self.total_jitter / self.frames if self.frames else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        Returns the statistics as a plain dictionary
+        """
+        return {'playbacks': self.playbacks,
+                'frames': self.frames,
+                'dropped': self.dropped,
+                'overruns': self.overruns,
+                'mean_jitter': self.mean_jitter,
+                'max_jitter': self.max_jitter}
+
+
+class FrameScheduler:
+    """
+    Schedules the frames of one animation playback.
+    """
+    def __init__(self,
+                 speed: float,
+                 num_frames: int,
+                 stats: Optional[FrameStats] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param speed: frames per second
+        :param num_frames: number of frames in the animation
+        :param stats: statistics the playback is recorded to
+        :param clock: monotonic clock returning seconds
+        """
+        if not speed > 0:
+            raise ValueError(f"The frame rate of an animation must be positive, got {speed}")
+        self.period: float = 1 / speed
+        self.num_frames: int = num_frames
+        self.stats: FrameStats = stats if stats is not None else FrameStats()
+        self._clock: Callable[[], float] = clock
+        self._start: Optional[float] = None
+        self._next: int = 0
+
+    @property
+    def finished(self) -> bool:
+        """
+        True once the last frame has been shown
+        """
+        return self._next >= self.num_frames
+
+    @property
+    def next_deadline(self) -> float:
+        """
+        Clock time at which the next frame is due (or the animation ends, once all frames are shown)
+        """
+        return self._start + self._next * self.period
+
+    def start(self,
+              now: Optional[float] = None) -> None:
+        """
+        Starts the playback: the first frame is due immediately.
+        """
+        self._start = self._clock() if now is None else now
+        self._next = 0
+        self.stats.playbacks += 1
+
+    def due_frame(self,
+                  now: Optional[float] = None) -> Optional[int]:
+        """
+        Returns the index of the frame to show now, or None if the next frame is not due yet (or the playback has
+        finished). If frames were missed, the latest due frame is returned and the missed ones are counted as dropped.
+        """
+        if self._start is None:
+            self.start(now)
+        if now is None:
+            now = self._clock()
+        if self.finished or now < self.next_deadline:
+            return None
+
+        index = min(max(int((now - self._start) / self.period), self._next), self.num_frames - 1)
+        jitter = now - (self._start + index * self.period)
+        self.stats.frames += 1
+        self.stats.dropped += index - self._next
+        if index > self._next and instrumentation.active is not None:
+            instrumentation.active.count('frames_dropped', index - self._next)
+        self.stats.total_jitter += jitter
+        if jitter > self.stats.max_jitter:
+            self.stats.max_jitter = jitter
+
+        self._next = index + 1
+        return index
+
+    def frame_done(self,
+                   now: Optional[float] = None) -> None:
+        """
+        Marks the end of the work for the frame just shown. A frame whose work runs past the deadline of the
+        following frame is counted as an overrun.
+        """
+        if now is None:
+            now = self._clock()
+        if not self.finished and now > self.next_deadline:
+            self.stats.overruns += 1
+
+
+class Animation:
+    """
+    A resumable animation playback. Each call to step() shows the frame that is due (if any) and returns straight
+    away, so the caller can keep doing other work (e.g. polling buttons) between frames.
+    """
+    def __init__(self,
+                 show_frame: Callable[[int], Any],
+                 num_frames: int,
+                 speed: float,
+                 stats: Optional[FrameStats] = None,
+                 cancellable: bool = True,
+                 on_start: Optional[Callable[[], Any]] = None,
+                 on_finish: Optional[Callable[[], Any]] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param show_frame: function displaying the frame of the given index
+        :param num_frames: number of frames in the animation
+        :param speed: frames per second
+        :param stats: statistics the playback is recorded to
+        :param cancellable: determines if the animation may be cut short (e.g. by a button press)
+        :param on_start: function called before the first frame is shown
+        :param on_finish: function called once the animation has finished or has been cancelled
+        :param clock: monotonic clock returning seconds
+        """
+        self.scheduler: FrameScheduler = FrameScheduler(speed, num_frames, stats, clock)
+        self.cancellable: bool = cancellable
+        self.on_start: Optional[Callable[[], Any]] = on_start
+        self.on_finish: Optional[Callable[[], Any]] = on_finish
+        self.done: bool = False
+        self._show_frame: Callable[[int], Any] = show_frame
+        self._clock: Callable[[], float] = clock
+        self._started: bool = False
+
+    @property
+    def next_deadline(self) -> float:
+        """
+        Clock time at which the animation next needs to be stepped (0.0, i.e. now, before it has started)
+        """
+        return self.scheduler.next_deadline if self._started else 0.0
+
+    def step(self,
+             now: Optional[float] = None) -> bool:
+        """
+        Shows the frame that is due, if any.
+
+        :return: True while the animation is still playing
+        """
+        if self.done:
+            return False
+        if now is None:
+            now = self._clock()
+        if not self._started:
+            self._started = True
+            if self.on_start is not None:
+                self.on_start()
+            self.scheduler.start(now)
+
+        index = self.scheduler.due_frame(now)
+        if index is not None:
+            self._show_frame(index)
+            self.scheduler.frame_done()
+        elif self.scheduler.finished and now >= self.scheduler.next_deadline:
+            # the last frame has been shown for its full frame period
+            self._finish()
+        return not self.done
+
+    def cancel(self) -> None:
+        """
+        Stops the animation where it is.
+        """
+        if not self.done:
+            self._finish()
+
+    def run(self,
+            sleep: Callable[[float], None] = time.sleep) -> None:
+        """
+        Plays the animation to completion, sleeping until each frame deadline.
+        """
+        while self.step():
+            sleep(max(0.0, self.next_deadline - self._clock()))
+
+    async def run_async(self) -> None:
+        """
+        Plays the animation to completion without blocking the event loop (awaitable form of run()).
+        """
+        import asyncio
+
+        while self.step():
+            await asyncio.sleep(max(0.0, self.next_deadline - self._clock()))
+
+    def _finish(self) -> None:
+        self.done = True
+        if self.on_finish is not None:
+            self.on_finish()
+
+
+def pause(seconds: float,
+          cancellable: bool = True,
+          on_finish: Optional[Callable[[], Any]] = None) -> Animation:
+    """
+    Returns an animation that shows nothing for the given time (a non-blocking replacement for sleep()).
+    """
+    if not seconds > 0:
+        raise ValueError(f"A pause must last a positive number of seconds, got {seconds}")
+    return Animation(lambda index: None, 1, 1 / seconds, cancellable=cancellable, on_finish=on_finish)
@@ -0,0 +1,135 @@
+"""
+Decoding of raw button integers into input events.
+
+Button integers have the first (leftmost) button as the most significant bit, so the index of a single pressed
+button is num_buttons - mask.bit_length(): no scan over the buttons is needed, whatever the number of chained boards.
+
+Event kinds:
+    'press'      - a single button has been pressed
+    'chord'      - several buttons have been pressed together
+    'long_press' - the button(s) of the last press / chord have been held for the long press time
+    'repeat'     - the button(s) are still held, sent every repeat interval after the long press
+"""
+from typing import List, NamedTuple, Optional, Tuple
+
+PRESS: str = 'press'
+CHORD: str = 'chord'
+LONG_PRESS: str = 'long_press'
+REPEAT: str = 'repeat'
+
+
+class InputEvent(NamedTuple):
+    """
+    A decoded button input
+    """
+    kind: str  # one of PRESS, CHORD, LONG_PRESS, REPEAT
+    mask: int  # integer of the buttons, first button = most significant bit
+    button: Optional[int]  # index of the button from the left (None for chords)
+    buttons: Tuple[int, ...]  # indexes of all the buttons from the left
+    timestamp: float  # monotonic time of the input
+
+
+def button_index(mask: int,
+                 num_buttons: int) -> int:
+    """
+    Index from the left of the (leftmost) button of a button integer
+    """
+    return num_buttons - mask.bit_length()
+
+
+def button_indexes(mask: int,
+                   num_buttons: int) -> Tuple[int, ...]:
+    """
+    Indexes from the left of all the buttons of a button integer (one step per pressed button)
+    """
+    indexes = []
+    while mask:
+        lowest = mask & -mask
+        indexes.append(num_buttons - lowest.bit_length())
+        mask ^= lowest
+    return tuple(reversed(indexes))
+
+
+class InputDecoder:
+    """
+    Turns successive readings of the buttons into input events.
+    """
+    def __init__(self,
+                 num_buttons: int = 8,
+                 long_press: float = 0.8,
+                 repeat_interval: float = 0.25) -> None:
+        """
+        :param num_buttons: number of buttons (8 per board)
+        :param long_press: seconds a press must be held to send a long press event
+        :param repeat_interval: seconds between repeat events while the buttons stay held after a long press
+        """
+        self.num_buttons: int = num_buttons
+        self.long_press: float = long_press
+        self.repeat_interval: float = repeat_interval
+
+        self._held: int = 0
+        self._press_event: Optional[InputEvent] = None
+        self._next_hold_event: float = 0.0
+        self._long_press_sent: bool = False
+
+    @property
+    def held(self) -> int:
+        """
+        Integer of the buttons of the current press (0 when released)
+        """
+        return self._held
+
+    def decode(self,
+               mask: int,
+               timestamp: float = 0.0) -> InputEvent:
+        """
+        Decodes a button integer into a press (single button) or chord event
+        """
+        if mask & (mask - 1):
+            return InputEvent(CHORD, mask, None, button_indexes(mask, self.num_buttons), timestamp)
+        button = button_index(mask, self.num_buttons)
+        return InputEvent(PRESS, mask, button, (button,), timestamp)
+
+    def update(self,
+               mask: int,
+               now: float) -> List[InputEvent]:
+        """
+        Takes a reading of the buttons.
+        Like the original edge detection, a press is only reported once all buttons have been released, buttons
+        pressed while others are held are ignored.
+
+        :param mask: integer of the buttons currently pressed
+        :param now: monotonic time of the reading
+        :return: the input events of this reading (usually none)
+        """
+        if not mask:
+            self._held = 0
+            return []
+
+        if not self._held:
+            self._held = mask
+            self._press_event = self.decode(mask, now)
+            self._next_hold_event = now + self.long_press
+            self._long_press_sent = False
+            return [self._press_event]
+
+        hold_event = self.tick(now)
+        return [hold_event] if hold_event is not None else []
+
+    def tick(self,
+             now: float) -> Optional[InputEvent]:
+        """
+        Checks the hold time of the current press without a new reading.
+
+        :return: a long press or repeat event if one is due
+        """
+        if not self._held or now < self._next_hold_event:
+            return None
+
+        kind = REPEAT if self._long_press_sent else LONG_PRESS
+        self._long_press_sent = True
+        # keep the repeats on their interval, without bursts after a late tick
+        self._next_hold_event += self.repeat_interval
+        if self._next_hold_event <= now:
+            self._next_hold_event = now + self.repeat_interval
+        return self._press_event._replace(kind=kind, timestamp=now)
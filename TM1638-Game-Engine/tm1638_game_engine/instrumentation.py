@@ -0,0 +1,231 @@
+"""
+Low-overhead timing probes for the engine hot paths.
+
+Probes are disabled by default: every probe site only checks `instrumentation.active is not None`, so the cost of a
+disabled probe is a single attribute read. Once enabled, timings feed fixed-bucket latency histograms (no samples
+are stored, a recording is one bisect and two additions) and events feed counters.
+
+    from tm1638_game_engine import instrumentation
+    instrumentation.enable(dump_interval=60)  # optional periodic dump (JSON line on stderr)
+    ...
+    instrumentation.stats()  # snapshot of the histograms and counters
+
+Histograms:
+    'input_poll' - reading / decoding the buttons (SevenSegButtonGame._next_input_event)
+    'turn'       - a whole MiniGame turn (play / play_async, awaited time included)
+    'callback'   - each MiniGame callback called by a turn
+    'encode'     - encoding a line of characters (display_line, scroll)
+    'bus_write'  - sending a frame to the boards (commit)
+Counters:
+    'bus_bytes', 'bus_writes', 'frames_dropped', 'input_events', 'presses_handled'
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Optional, Sequence
+
+
+# upper bounds of the histogram buckets in microseconds (a last bucket takes anything slower)
+DEFAULT_BOUNDS_US: Sequence[float] = (1, 2, 5, 10, 20, 50, 100, 200, 500,
+                                      1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000)
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets
+    """
+    __slots__ = ('bounds_us', 'counts', 'count', 'total_ns', 'max_ns', '_bounds_ns')
+
+    def __init__(self,
+                 bounds_us: Sequence[float] = DEFAULT_BOUNDS_US) -> None:
+        """
+        :param bounds_us: increasing upper bounds of the buckets in microseconds
+        """
+        self.bounds_us: Sequence[float] = tuple(bounds_us)
+        self._bounds_ns = tuple(int(bound * 1000) for bound in self.bounds_us)
+        self.counts = [0] * (len(self.bounds_us) + 1)
+        self.count: int = 0
+        self.total_ns: int = 0
+        self.max_ns: int = 0
+
+    def record(self,
+               elapsed_ns: int) -> None:
+        """
+        Adds a timing in nanoseconds
+        """
+        self.counts[bisect_left(self._bounds_ns, elapsed_ns)] += 1
+        self.count += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+    def merge(self,
+              other: 'Histogram') -> None:
+        """
+        Adds the timings of a histogram with the same buckets (e.g. from another process)
+        """
+        assert other.bounds_us == self.bounds_us, "Only histograms with the same buckets can be merged"
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def percentile(self,
+                   fraction: float) -> float:
+        """
+        Upper bound (in microseconds) of the bucket holding the given fraction of the timings (the maximum for the
+        last bucket)
+        """
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target and bucket_count:
+                if index < len(self.bounds_us):
+                    return float(self.bounds_us[index])
+                break
+        return self.max_ns / 1000
+
+    def as_dict(self) -> Dict[str, Any]:
+        buckets = {f'<={bound}us': count for bound, count in zip(self.bounds_us, self.counts) if count}
+        if self.counts[-1]:
+            buckets[f'>{self.bounds_us[-1]}us'] = self.counts[-1]
+        return {'count': self.count,
+                'mean_us': self.total_ns / self.count / 1000 if self.count else 0.0,
+                'p50_us': self.percentile(0.5),
+                'p99_us': self.percentile(0.99),
+                'max_us': self.max_ns / 1000,
+                'buckets': buckets}
+
+
+class Instrumentation:
+    """
+    Histograms and counters fed by the probes
+    """
+    def __init__(self,
+                 bounds_us: Sequence[float] = DEFAULT_BOUNDS_US) -> None:
+        """
+        :param bounds_us: upper bounds of the histogram buckets in microseconds
+        """
+        self.bounds_us: Sequence[float] = bounds_us
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.started: float = time.monotonic()
+
+        self._dump_stop: threading.Event = threading.Event()
+        self._dump_thread: Optional[threading.Thread] = None
+
+    def record(self,
+               name: str,
+               elapsed_ns: int) -> None:
+        """
+        Adds a timing (in nanoseconds) to a histogram
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(self.bounds_us)
+        histogram.record(elapsed_ns)
+
+    def count(self,
+              name: str,
+              amount: int = 1) -> None:
+        """
+        Increments a counter
+        """
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of the histograms and counters
+        """
+        return {'uptime': time.monotonic() - self.started,
+                'histograms': {name: histogram.as_dict() for name, histogram in list(self.histograms.items())},
+                'counters': dict(self.counters)}
+
+    def reset(self) -> None:
+        """
+        Clears the histograms and counters
+        """
+        self.histograms = {}
+        self.counters = {}
+        self.started = time.monotonic()
+
+    def start_dump(self,
+                   interval: float,
+                   dump: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+        """
+        Dumps a stats() snapshot periodically from a background thread
+
+        :param interval: seconds between dumps
+        :param dump: function receiving the snapshots, by default a JSON line is written to stderr
+        """
+        self.stop_dump()
+        if dump is None:
+            dump = _dump_json_line
+        self._dump_stop.clear()
+
+        def run() -> None:
+            while not self._dump_stop.wait(interval):
+                dump(self.stats())
+
+        self._dump_thread = threading.Thread(target=run, name='tm1638-stats-dump', daemon=True)
+        self._dump_thread.start()
+
+    def stop_dump(self) -> None:
+        """
+        Stops the periodic dump
+        """
+        self._dump_stop.set()
+        if self._dump_thread is not None:
+            self._dump_thread.join()
+            self._dump_thread = None
+
+
+def _dump_json_line(snapshot: Dict[str, Any]) -> None:
+    import json
+
+    print(json.dumps(snapshot), file=sys.stderr, flush=True)
+
+
+# the enabled instrumentation (None when the probes are disabled)
+active: Optional[Instrumentation] = None
+
+
+def enable(dump_interval: Optional[float] = None,
+           dump: Optional[Callable[[Dict[str, Any]], None]] = None,
+           bounds_us: Sequence[float] = DEFAULT_BOUNDS_US) -> Instrumentation:
+    """
+    Enables the probes (replacing any instrumentation already enabled)
+
+    :param dump_interval: if given, seconds between periodic dumps of the stats
+    :param dump: function receiving the periodic snapshots (JSON line on stderr by default)
+    :param bounds_us: upper bounds of the histogram buckets in microseconds
+    :return: the enabled instrumentation
+    """
+    global active
+    disable()
+    instrumentation = Instrumentation(bounds_us)
+    if dump_interval:
+        instrumentation.start_dump(dump_interval, dump)
+    active = instrumentation
+    return instrumentation
+
+
+def disable() -> None:
+    """
+    Disables the probes
+    """
+    global active
+    if active is not None:
+        active.stop_dump()
+    active = None
+
+
+def stats() -> Dict[str, Any]:
+    """
+    Snapshot of the enabled instrumentation (empty if the probes are disabled)
+    """
+    return active.stats() if active is not None else {}
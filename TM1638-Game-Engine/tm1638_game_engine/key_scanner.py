@@ -0,0 +1,155 @@
+"""
+Background key scanning for the TM1638 buttons.
+
+A KeyScanner thread reads the buttons at a fixed rate, debounces the readings and pushes a KeyEvent for every
+debounced change into an EventRing. The game loop drains the ring without ever sleeping or touching the bus.
+"""
+import threading
+import time
+from typing import Any, Callable, List, NamedTuple, Optional
+
+
+class KeyEvent(NamedTuple):
+    """
+    A debounced change of the buttons
+    """
+    timestamp: float  # monotonic time the change was first seen
+    mask: int  # buttons held after the change
+    pressed: int  # buttons pressed by the change
+    released: int  # buttons released by the change
+
+
+class EventRing:
+    """
+    Fixed size single-producer / single-consumer ring buffer.
+
+    It needs no lock: only the producer moves the write counter and only the consumer moves the read counter, and
+    an item is stored before the write counter makes it visible. When the ring is full new items are dropped (and
+    counted) so that the consumer never sees a partly overwritten ring.
+    """
+    def __init__(self,
+                 capacity: int = 64) -> None:
+        self.capacity: int = capacity
+        self.dropped: int = 0
+        self._items: List[Any] = [None] * capacity
+        self._write: int = 0
+        self._read: int = 0
+
+    def __len__(self) -> int:
+        return self._write - self._read
+
+    def push(self,
+             item: Any) -> bool:
+        """
+        Adds an item (producer side)
+        :return: False if the ring was full and the item has been dropped
+        """
+        if self._write - self._read >= self.capacity:
+            self.dropped += 1
+            return False
+        self._items[self._write % self.capacity] = item
+        self._write += 1
+        return True
+
+    def pop(self) -> Optional[Any]:
+        """
+        Removes and returns the oldest item, or None if the ring is empty (consumer side)
+        """
+        if self._read == self._write:
+            return None
+        item = self._items[self._read % self.capacity]
+        self._read += 1
+        return item
+
+
+class KeyScanner:
+    """
+    Reads the buttons from a background thread and queues debounced press / release events.
+    """
+    def __init__(self,
+                 read_buttons: Callable[[], int],
+                 scan_rate: float = 200,
+                 debounce: float = 0.01,
+                 capacity: int = 64) -> None:
+        """
+        :param read_buttons: function returning the integer of the buttons currently pressed
+        :param scan_rate: button reads per second
+        :param debounce: seconds a change must be stable before it is reported
+        :param capacity: number of events held before new events are dropped
+        """
+        self.scan_rate: float = scan_rate
+        self.debounce: float = debounce
+        self.events: EventRing = EventRing(capacity)
+        self.scans: int = 0
+
+        self._read_buttons: Callable[[], int] = read_buttons
+        self._stable: int = 0
+        self._candidate: int = 0
+        self._candidate_since: float = 0.0
+        self._stop: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def mask(self) -> int:
+        """
+        The debounced state of the buttons
+        """
+        return self._stable
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Starts the scan thread
+        """
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='tm1638-key-scan', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the scan thread (waits for the current read to finish)
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def scan(self,
+             now: Optional[float] = None) -> None:
+        """
+        Performs one read and queues an event if a change has been stable for the debounce time.
+        Called by the scan thread, may also be called directly when no thread is used.
+        """
+        raw = self._read_buttons()
+        if now is None:
+            now = time.monotonic()
+        self.scans += 1
+
+        if raw != self._candidate:
+            self._candidate = raw
+            self._candidate_since = now
+        if raw != self._stable and now - self._candidate_since >= self.debounce:
+            previous = self._stable
+            self._stable = raw
+            self.events.push(KeyEvent(self._candidate_since, raw, raw & ~previous, previous & ~raw))
+
+    def _run(self) -> None:
+        """
+        Scan loop, reading at absolute deadlines so the scan rate does not drift
+        """
+        period = 1 / self.scan_rate
+        next_scan = time.monotonic()
+        while not self._stop.is_set():
+            self.scan()
+            next_scan += period
+            wait = next_scan - time.monotonic()
+            if wait < 0:
+                # fell behind, do not try to catch up with a burst of reads
+                next_scan = time.monotonic()
+                wait = 0
+            self._stop.wait(wait)
@@ -0,0 +1,77 @@
+"""
+Scrolling text for lines longer than the displays (see TM1638Animated.scroll).
+
+A Marquee encodes its line once into a contiguous strip of segment values, padded with blanks as the scroll mode
+needs, and each frame is a window of the strip: a memoryview slice at the frame's offset, written to the displays
+without copying or encoding anything while the text scrolls.
+
+Scroll modes:
+    'once'   - the line enters on the right and scrolls out on the left
+    'loop'   - the line scrolls round continuously, a gap of blanks separating the end from the start
+    'bounce' - the line scrolls left until its end is shown, then back to its start (a line that fits the displays
+               is shown still)
+"""
+from typing import Tuple
+
+from .seg_font import encode_line
+
+SCROLL_MODES: Tuple[str, ...] = ('once', 'loop', 'bounce')
+
+
+class Marquee:
+    """
+    The frames of a scrolling line, as windows of one encoded strip of segment values
+    """
+    __slots__ = ('strip', 'width', 'mode', 'offsets', '_view')
+
+    def __init__(self,
+                 line: str,
+                 width: int,
+                 mode: str = 'once',
+                 gap: int = 3) -> None:
+        """
+        :param line: string (or number) of characters, or a list of characters or unmapped segment values
+        :param width: number of displays the line scrolls across
+        :param mode: 'once', 'loop' or 'bounce' (see the module documentation)
+        :param gap: number of blanks between the end and the start of the line in 'loop' mode
+        """
+        assert mode in SCROLL_MODES, f"Unknown scroll mode {mode!r}, expected one of {', '.join(SCROLL_MODES)}"
+        assert width > 0, "A marquee needs at least one display"
+        encoded = encode_line(line)
+        length = len(encoded)
+        blanks = bytes(width)
+
+        if mode == 'once':
+            strip = blanks + encoded + blanks
+            # from the first character on the right to the last one gone on the left
+            offsets = tuple(range(1, length + width + 1))
+        elif mode == 'loop':
+            period = encoded + bytes(gap)
+            if not period:
+                period = blanks
+            # the windows of the last offsets wrap round to the start of the line
+            strip = period * (1 + -(-width // len(period)))
+            offsets = tuple(range(len(period)))
+        else:
+            strip = encoded + bytes(max(0, width - length))
+            last = len(strip) - width
+            offsets = tuple(range(last + 1)) + tuple(range(last - 1, 0, -1))
+
+        self.strip: bytes = strip
+        self.width: int = width
+        self.mode: str = mode
+        self.offsets: Tuple[int, ...] = offsets
+        self._view: memoryview = memoryview(strip)
+
+    def __len__(self) -> int:
+        """
+        Number of frames of one pass (a bounce being there and back)
+        """
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> memoryview:
+        """
+        Window of the strip shown by a frame. Frame indexes past the first pass repeat the passes.
+        """
+        offset = self.offsets[index % len(self.offsets)]
+        return self._view[offset:offset + self.width]
@@ -0,0 +1,129 @@
+"""
+Background pre-generation of the MiniGame puzzles.
+
+A PuzzlePool keeps puzzles (the attributes returned by MiniGame.puzzle_generator: answers, starting display, LEDs...)
+ready for the registered games, generating them on a background thread while the current round is played. The setup
+of a game then only takes a ready puzzle.
+
+Every game name draws from its own random.Random, seeded from the game's rng when the name is first added, and its
+puzzles are generated and taken in order: the n-th puzzle of a game does not depend on when it was generated, so
+seeded sessions stay reproducible. Only the games whose puzzle_generator takes 'rng' are pooled: a generator drawing
+from the random module would share its state with the game thread.
+"""
+import random
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+# puzzle: the game attributes to be set (see MiniGame.puzzle_generator)
+Puzzle = Dict[str, Any]
+
+
+class PuzzlePool:
+    """
+    Generates the puzzles of the registered games on a background thread
+    """
+    def __init__(self,
+                 depth: int = 1) -> None:
+        """
+        :param depth: number of puzzles kept ready for each game
+        """
+        self.depth: int = depth
+        self._games: Dict[str, Any] = {}
+        self._rngs: Dict[str, random.Random] = {}
+        self._ready: Dict[str, Deque[Puzzle]] = {}
+        self._errors: Dict[str, BaseException] = {}
+        self._generating: Optional[str] = None
+        self._condition: threading.Condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stop: bool = False
+
+    def add_game(self,
+                 name: str,
+                 game) -> None:
+        """
+        Adds a game whose puzzles are to be generated, or replaces the game of a name (e.g. by the game of the next
+        round, its puzzles being generated from the same stream). The generation starts with the first game.
+
+        :param name: name of the game
+        :param game: MiniGame with a puzzle_generator taking 'rng' (see MiniGame.pregenerable)
+        """
+        assert game.pregenerable, \
+            f"The puzzle_generator of {name} does not take 'rng', its puzzles cannot be generated in the background"
+        with self._condition:
+            if name not in self._rngs:
+                self._rngs[name] = random.Random(game.rng.getrandbits(64))
+                self._ready[name] = deque()
+            self._games[name] = game
+            self._condition.notify_all()
+        if self._thread is None:
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name='tm1638-puzzle-pool', daemon=True)
+            self._thread.start()
+
+    def take(self,
+             name: str) -> Puzzle:
+        """
+        Takes the next puzzle of a game, waiting for it to be generated if none is ready
+
+        :param name: name of the game
+        """
+        with self._condition:
+            while not self._ready[name]:
+                if name in self._errors:
+                    raise self._errors.pop(name)
+                self._condition.wait()
+            puzzle = self._ready[name].popleft()
+            self._condition.notify_all()
+            return puzzle
+
+    def ready(self,
+              name: str) -> int:
+        """
+        Number of puzzles ready for a game
+        """
+        return len(self._ready.get(name, ()))
+
+    def stop(self) -> None:
+        """
+        Stops the background generation
+        """
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _next_game(self) -> Optional[str]:
+        """
+        Name of a game needing a puzzle (None if every game has enough)
+        """
+        for name, ready in self._ready.items():
+            if len(ready) < self.depth and name not in self._errors:
+                return name
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                name = self._next_game()
+                while name is None and not self._stop:
+                    self._condition.wait()
+                    name = self._next_game()
+                if self._stop:
+                    return
+                game = self._games[name]
+                rng = self._rngs[name]
+
+            # generated outside the lock, the game loop keeps taking the puzzles already ready
+            try:
+                puzzle = game.generate_puzzle(rng)
+            except BaseException as error:
+                with self._condition:
+                    self._errors[name] = error
+                    self._condition.notify_all()
+                continue
+            with self._condition:
+                self._ready[name].append(puzzle)
+                self._condition.notify_all()
@@ -27,134 +27,374 @@ Please install the library using the library's included setup.py to enable impor
     Note: the import for this is only used in TM1638Animated if not in test_mode. This enables test_mode
     to be run on non raspberry pi devices that do not have GPIO etc.
 """
+import sys
+import threading
 import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional, Union
 
-from .decorators import testing_wrapper
-from .display_mocks import seg_mock, led_mock
+from . import instrumentation
+from .animation_frames import FrameSequence, animation_frames
+from .compositor import Compositor, Layer
+from .decorators import TestModeAttribute, testing_wrapper
+from .frame_scheduler import Animation, FrameStats
+from .seg_font import encode_line
+
+if TYPE_CHECKING:
+    # only loaded when used (test mode, key scan, animation files), to keep the start up fast
+    from .animation_file import AnimationFile
+    from .display_mocks import TerminalRenderer
+    from .key_scanner import KeyScanner
+
+
+# seconds between the button reads of check_button_values on the boards (prevents the board getting confused). A
+# driver with a `key_read_pause` attribute sets its own pause (0 for VirtualTMBoards).
+KEY_READ_PAUSE: float = 0.05
+
+# LED register values for every byte of an LED mask (most significant bit = leftmost LED)
+_LED_BITS = tuple(bytes((byte >> (7 - bit)) & 1 for bit in range(8)) for byte in range(256))
 
 
 class TM1638Animated():
     """
     TM1638Animated implements existing TM1638 library to add animations.
     """
+    # the animations pick their test implementation according to this flag
+    test_mode = TestModeAttribute()
+
     def __init__(self,
                  stb: int,
                  clk: int,
                  dio: int,
                  brightness: int = 1,
-                 test_mode: bool = False) -> None:
+                 test_mode: bool = False,
+                 device: Optional[object] = None) -> None:
+        """
+        :param stb: Specifies the stb pin number (or tuple of pin numbers for chained boards)
+        :param clk: Specifies the clk pin number
+        :param dio: Specifies the dio pin number
+        :param brightness: brightness of the displays (0 - 7)
+        :param test_mode: prints the display output instead of driving the boards
+        :param device: driver used instead of rpi_TM1638 TMBoards, e.g. VirtualTMBoards (see virtual_tm1638.py) to
+            run headless. Ignored in test_mode.
+        """
 
         self.num_segments: int = 8
         self.num_leds: int = 8
+        self.num_boards: int = 1
 
         self.TM1638: object = None
+        # pause after each board read of check_button_values
+        self.key_read_pause: float = 0.0
 
         if not test_mode:
-            from rpi_TM1638.TMBoards import TMBoards
-            from .rpi_tm1638_overrides import SegmentsOverride
-            # from drivers.rpi_TM1638.TMBoards import TMBoards
-            self.TM1638: TMBoards = TMBoards(stb=stb,
-                                             clk=clk,
-                                             dio=dio,
-                                             brightness=brightness)
+            from .rpi_tm1638_overrides import SegmentsOverride, SwitchesOverride
+            if device is None:
+                from rpi_TM1638.TMBoards import TMBoards
+                # from drivers.rpi_TM1638.TMBoards import TMBoards
+                device = TMBoards(stb=stb,
+                                  clk=clk,
+                                  dio=dio,
+                                  brightness=brightness)
+            self.TM1638 = device
+            self.key_read_pause = getattr(device, 'key_read_pause', KEY_READ_PAUSE)
             # Functionally extend the TM driver
             self.TM1638._segments = SegmentsOverride(self.TM1638)
+            self.TM1638._switches = SwitchesOverride(self.TM1638)
 
-            self.num_segments: int = 8 * self.TM1638.nbBoards # number of seven-segment displays on board
+            self.num_boards: int = self.TM1638.nbBoards
+            self.num_segments: int = 8 * self.num_boards # number of seven-segment displays on board
+            self.num_leds: int = 8 * self.num_boards
 
             self.leds = self.TM1638.leds
             self.segments = self.TM1638.segments
             self.switches = self.TM1638.switches
 
         self.test_mode: bool = test_mode
-        self.bit_format: str = f'0{self.num_segments}b'
+        self.bit_format: str = f'0{self.num_leds}b'
+
+        # The writes go to the layers of the compositor, merged into _frame on commit (see compositor.py)
+        self.compositor: Compositor = Compositor(self.num_segments)
+        # commits are deferred to the end of the outermost tick() (see tick())
+        self._tick_depth: int = 0
+        self._commit_pending: bool = False
+        self._tick_blitting: bool = False
+
+        # Shadow framebuffer: a 16 register image per board laid out as on the TM1638 (segment bytes at even
+        # addresses, LED bits at odd addresses). _frame is the merged frame, _shadow is what the boards show.
+        self._frame: bytearray = bytearray(16 * self.num_boards)
+        self._shadow: bytearray = bytearray(16 * self.num_boards)
+        if not test_mode:
+            # the segments driver keeps the register image of the boards
+            self._shadow = self.TM1638.segments.registers
+        self.last_commit_bytes: int = 0
+
+        # called with the register image and True for animation frames (blit_frame) after every commit sending data
+        self.on_commit: Optional[Callable[[bytearray, bool], None]] = None
+        self._blitting: bool = False
+
+        # test_mode output: the committed frames are drawn to the terminal
+        self.renderer: Optional['TerminalRenderer'] = None
+        if test_mode:
+            from . import display_mocks
+            self.renderer = display_mocks.TerminalRenderer(self.num_segments)
+
+        # frame timing statistics of each animation played
+        self.animation_stats: Dict[str, FrameStats] = {}
+
+        # background button reads (see start_key_scan) share the bus with the display writes
+        self.key_scanner: Optional['KeyScanner'] = None
+        self._bus_lock: threading.Lock = threading.Lock()
 
 
     @testing_wrapper(message="Performing <ROLL animation>")
     def roll(self,
              speed: int = 10,
-             rolls: int = 3):
+             rolls: int = 3,
+             block: bool = True) -> Optional[Animation]:
         """
         Roll animation
         :param speed: controls the speed of animation.
         :param rolls: number of rolls to be executed.
+        :param block: if False, the animation is returned to be stepped by the caller instead of being played.
         """
-        self.clear_display()
-        for num in range(rolls):
-            led_bit = 1
-            while led_bit < 64:
-                line = [led_bit for i in range(self.num_segments)]
-                self.display_line(line)
-                led_bit = led_bit << 1
-                time.sleep(1/speed)
+        return self.play_frames(animation_frames('roll', self.num_segments, rolls), speed, 'roll', block)
 
     @testing_wrapper(message="Performing <WAVE animation>")
     def wave(self,
              speed: int = 10,
-             waves: int = 2):
+             waves: int = 2,
+             block: bool = True) -> Optional[Animation]:
         """
         Wave animation
         :param speed: controls the speed of animation.
         :param waves: number of waves to display.
+        :param block: if False, the animation is returned to be stepped by the caller instead of being played.
         """
-        self.clear_display()
-        for wave in range(waves):
-            for place in range(6):
-                line = [1 << pos + place if pos + place < 6
-                        else 1 << pos + place - 6
-                        for pos in range(8)]
-                self.display_line(line)
-                time.sleep(1/speed)
+        return self.play_frames(animation_frames('wave', self.num_segments, waves), speed, 'wave', block)
 
     @testing_wrapper(message="Performing <LOAD animation>")
     def load(self,
-             speed: int = 10):
+             speed: int = 10,
+             block: bool = True) -> Optional[Animation]:
         """
         Load animation
         :param speed: controls the speed of animation.
+        :param block: if False, the animation is returned to be stepped by the caller instead of being played.
         """
-        self.clear_display()
-        for pos in range(self.num_segments):
-            self.display_line(' .' * pos)
-            time.sleep(1/speed)
+        return self.play_frames(animation_frames('load', self.num_segments), speed, 'load', block)
 
     @testing_wrapper(message="Performing <UNLOAD animation>")
     def unload(self,
-               speed: int = 10):
+               speed: int = 10,
+               block: bool = True) -> Optional[Animation]:
         """
         Unload animation
         :param speed: controls the speed of animation.
+        :param block: if False, the animation is returned to be stepped by the caller instead of being played.
+        """
+        return self.play_frames(animation_frames('unload', self.num_segments), speed, 'unload', block)
+
+    def play_frames(self,
+                    frames: FrameSequence,
+                    speed: int = 10,
+                    name: str = 'frames',
+                    block: bool = True,
+                    cancellable: bool = True,
+                    clear: bool = True) -> Animation:
+        """
+        Plays precomputed frames against absolute frame deadlines (late frames are skipped rather than slowing the
+        animation down). Custom animations should be played through this function.
+        :param frames: the frames of segment values (and optionally LED states) to display
+        :param speed: controls the speed of animation (frames per second).
+        :param name: name the frame timing is recorded under in self.animation_stats
+        :param block: if False, the animation is returned without being played so that it can be advanced with
+            Animation.step() (e.g. from a game loop that keeps polling the buttons).
+        :param cancellable: determines if the animation may be cut short by a button press
+        :param clear: blanks the displays and LEDs under the animation (the layers below are kept, see
+            compositor.py, and uncovered when the animation ends)
+        :return: the animation
+        """
+        leds = frames.leds
+
+        def show_frame(index: int) -> None:
+            self.blit_frame(frames[index], leds=leds[index] if leds is not None else None)
+
+        animation = Animation(show_frame,
+                              len(frames),
+                              speed,
+                              stats=self.animation_stats.setdefault(name, FrameStats()),
+                              cancellable=cancellable,
+                              on_start=self._blank_animation_layer if clear else None,
+                              on_finish=self._end_animation)
+        if block:
+            animation.run()
+        return animation
+
+    def play_file(self,
+                  animation: Union[str, 'AnimationFile'],
+                  speed: Optional[float] = None,
+                  block: bool = True,
+                  cancellable: bool = True,
+                  clear: bool = True) -> Animation:
         """
-        self.clear_display()
-        pos = self.num_segments
-        while pos >= 0:
-            self.display_line(' ' * self.num_segments)
-            self.display_line(' .' * pos)
-            pos -= 1
-            time.sleep(1/speed)
+        Plays an animation file (see animation_file.py), the frames being read from the file mapped in memory.
+        An animation made for fewer boards is shown on the first boards (displays and LEDs).
+        :param animation: path of the animation file (mapped until the animation ends), or an AnimationFile
+        :param speed: frames per second (the frame rate of the file by default)
+        :param block: if False, the animation is returned without being played so that it can be advanced with
+            Animation.step()
+        :param cancellable: determines if the animation may be cut short by a button press
+        :param clear: blanks the displays and LEDs under the animation (the layers below are kept, see
+            compositor.py, and uncovered when the animation ends)
+        :return: the animation
+        """
+        from .animation_file import AnimationFile
+
+        opened = isinstance(animation, str)
+        if opened:
+            animation = AnimationFile(animation)
+        try:
+            assert animation.num_boards <= self.num_boards, \
+                f"{animation.path} is made for {animation.num_boards} boards, {self.num_boards} are connected"
+        except AssertionError:
+            if opened:
+                animation.close()
+            raise
+
+        playback = self.play_frames(animation, speed or animation.speed, animation.path, False, cancellable, clear)
+        if opened:
+            end_animation = playback.on_finish
+
+            def on_finish() -> None:
+                end_animation()
+                animation.close()
+
+            playback.on_finish = on_finish
+        if block:
+            playback.run()
+        return playback
+
+    def blit_frame(self,
+                   frame: bytes,
+                   start: int = 0,
+                   leds: Optional[int] = None) -> int:
+        """
+        Displays a raw frame of segment values without encoding or validation, on the animation layer (covering the
+        layers below until the animation ends)
+        :param frame: one segment value per display, starting from the first display
+        :param start: index of the first display written (the other displays are left untouched)
+        :param leds: integer of the LEDs of the displays written to be lit (first LED = most significant bit), LEDs are
+            left untouched if None
+        :return: number of bytes written to the bus
+        """
+        layer = self.compositor.layers['animation']
+        layer.set_segment_bytes(frame, start)
+        if leds is not None:
+            # one LED per display, the LEDs of the other displays are left untouched
+            shift = self.num_leds - start - len(frame)
+            layer.set_leds(leds << shift, ((1 << len(frame)) - 1) << shift)
+        self._blitting = True
+        try:
+            return self.commit()
+        finally:
+            self._blitting = False
+
+    def _blank_animation_layer(self) -> None:
+        """
+        Covers the layers below the animation with blank displays and LEDs as an animation starts
+        """
+        layer = self.compositor.layers['animation']
+        layer.set_segment_bytes(bytes(self.num_segments))
+        layer.set_leds(0, (1 << self.num_leds) - 1)
+        self.commit()
+
+    def _end_animation(self) -> None:
+        """
+        Uncovers the layers below the animation once an animation has ended
+        """
+        self.compositor.layers['animation'].clear()
+        self.commit()
+        if self.renderer is not None:
+            self.renderer.flush()
+
+    def scroll(self,
+               line: str,
+               speed: float = 4,
+               mode: str = 'once',
+               repeats: Optional[int] = 1,
+               start: int = 0,
+               width: Optional[int] = None,
+               gap: int = 3,
+               block: bool = True,
+               cancellable: bool = True) -> Animation:
+        """
+        Scrolls a line across the displays (for lines longer than the displays, see marquee.py for the modes).
+        The line is encoded once, each frame only writes a window of the encoded line to the boards.
+        :param line: string (or number) of characters, or a list of characters or unmapped segment values
+        :param speed: scrolling speed (displays per second)
+        :param mode: 'once', 'loop' or 'bounce'
+        :param repeats: number of passes (a bounce pass being there and back), None to scroll until cancelled
+        :param start: index of the first display scrolled across
+        :param width: number of displays scrolled across (all the displays from start by default). The other
+            displays are left untouched.
+        :param gap: number of blanks between the end and the start of the line in 'loop' mode
+        :param block: if False, the animation is returned without being played so that it can be advanced with
+            Animation.step() while the buttons keep being polled (e.g. queued with SevenSegButtonGame.play_animation)
+        :param cancellable: determines if the scrolling may be cut short by a button press
+        :return: the animation
+        """
+        from .marquee import Marquee
+
+        if width is None:
+            width = self.num_segments - start
+        assert 0 <= start and start + width <= self.num_segments, \
+            f"Displays {start} to {start + width - 1} are out of the {self.num_segments} segment displays"
+        assert repeats is not None or not block, "A scroll without an end can only be played with block=False"
+
+        probe = instrumentation.active
+        started = time.perf_counter_ns() if probe is not None else 0
+        marquee = Marquee(line, width, mode, gap)
+        if probe is not None:
+            probe.record('encode', time.perf_counter_ns() - started)
+
+        animation = Animation(lambda index: self.blit_frame(marquee[index], start),
+                              len(marquee) * repeats if repeats is not None else sys.maxsize,
+                              speed,
+                              stats=self.animation_stats.setdefault('scroll', FrameStats()),
+                              cancellable=cancellable,
+                              on_finish=self._end_animation)
+        if block:
+            animation.run()
+        return animation
 
     def display_line(self,
-                     line: str):
+                     line: str,
+                     start: int = 0,
+                     width: Optional[int] = None):
         """
         Displays a line of custom values
-        :param line:
-        """
-        check_line = line
-        if isinstance(line, str):
-            check_line = line.replace('.', '')
-            line = f"{line}{' ' * (self.num_segments - len(line))}"
-        elif isinstance(line, float):
-            check_line = str(line).replace('.', '')
-        assert len(check_line) <= self.num_segments, \
-            f"This board is currently configured for a maximum of {self.num_segments} segment displays. " \
+        :param line: string (or number) of characters, or a list of characters or unmapped segment values
+        :param start: index of the first display written (e.g. 8 * n for the n-th board of a chain)
+        :param width: number of displays written, the line being padded with blanks (all the displays from start
+            by default). The other displays are left untouched.
+        """
+        if width is None:
+            width = self.num_segments - start
+        assert 0 <= start and start + width <= self.num_segments, \
+            f"Displays {start} to {start + width - 1} are out of the {self.num_segments} segment displays"
+
+        probe = instrumentation.active
+        started = time.perf_counter_ns() if probe is not None else 0
+        encoded = encode_line(line, width)
+        if probe is not None:
+            probe.record('encode', time.perf_counter_ns() - started)
+        assert len(encoded) <= width, \
+            f"This board is currently configured for a maximum of {width} segment displays. " \
             "Use self.scroll() for longer display lines"
 
-        if self.test_mode:
-            test_seg = seg_mock()
-            test_seg.print_segs(line)
-            return
-
-        self.TM1638.segments[0] = line
+        self.set_segment_bytes(encoded, start)
+        self.commit()
 
     def LEDs(self,
              value: int) -> None:
@@ -163,17 +403,8 @@ class TM1638Animated():
 
         NOTE: to display the LED based in the LED's integer number, use leds[i] = <bool>
         """
-        if self.test_mode:
-            test_leds = led_mock(self.num_leds)
-            test_leds.print_val(value)
-            return
-
-        # Output the LED value
-        val_byte = str(format(value, self.bit_format))
-        val_i = 0
-        for bit in val_byte:
-            self.TM1638.leds[val_i] = int(bit)
-            val_i += 1
+        self.set_led_mask(value)
+        self.commit()
 
     def LEDs_from_left(self,
                        value: int) -> None:
@@ -181,35 +412,192 @@ class TM1638Animated():
         Displays a number expressed as LEDs illuminated from the left
         e.g. 4 = 1,1,1,1,0,0,0,0 (first 4 LEDs illuminated)
         """
-        if self.test_mode:
-            test_leds = led_mock(self.num_leds)
-            test_leds.print_val_from_left(value)
-            return
+        value = max(0, min(value, self.num_leds))
+        self.set_led_mask(((1 << value) - 1) << (self.num_leds - value))
+        self.commit()
 
-        # Clear and output LEDs
-        for led in range(self.num_segments):
-            self.TM1638.leds[led] = False or (led < value)
+    def set_segment_bytes(self,
+                          data: bytes,
+                          start: int = 0) -> None:
+        """
+        Writes raw segment values into the current layer (see layer()). Nothing is sent to the board until commit()
+        is called.
+        :param data: segment values (bit 0 = top segment ... bit 6 = middle segment, bit 7 = dot)
+        :param start: index of the first 7-segment display to be written
+        """
+        stop = start + len(data)
+        assert 0 <= start and stop <= self.num_segments, \
+            f"Segments {start}-{stop - 1} are outside of the {self.num_segments} segment displays"
+        self.compositor.target.set_segment_bytes(data, start)
+
+    def set_led_mask(self,
+                     value: int) -> None:
+        """
+        Writes the LED states into the current layer (see layer()) from the binary form of an integer (first LED =
+        most significant bit). Nothing is sent to the board until commit() is called.
+        :param value: integer of the LEDs to be lit
+        """
+        all_leds = (1 << self.num_leds) - 1
+        self.compositor.target.set_leds(value & all_leds, all_leds)
+
+    @contextmanager
+    def layer(self,
+              name: str) -> Iterator[Layer]:
+        """
+        Directs the writes (display_line(), LEDs()...) to a layer of the compositor, the 'game' layer being written
+        otherwise. e.g.
+            with tm.layer('overlay'):
+                tm.display_line('PAUSED')
+        """
+        compositor = self.compositor
+        previous = compositor.target
+        compositor.target = compositor.layers[name]
+        try:
+            yield compositor.target
+        finally:
+            compositor.target = previous
+
+    def clear_layer(self,
+                    name: str) -> None:
+        """
+        Uncovers a layer, showing the layers below it
+        """
+        self.compositor.layers[name].clear()
+        self.commit()
+
+    @contextmanager
+    def tick(self) -> Iterator[None]:
+        """
+        Defers the commits made within the block to its end, so that the writes of a loop call are sent to the boards
+        as one frame (see present() to send the frame earlier, e.g. before a pause). Ticks may be nested.
+        """
+        self._tick_depth += 1
+        try:
+            yield
+        finally:
+            self._tick_depth -= 1
+            if not self._tick_depth:
+                if self._commit_pending:
+                    self.present()
+                if self.renderer is not None:
+                    self.renderer.flush()
+
+    def commit(self) -> int:
+        """
+        Sends the merged layers to the boards (see present()), or only marks the frame as pending within a tick().
+        :return: number of bytes written to the bus (also stored as self.last_commit_bytes)
+        """
+        if self._tick_depth:
+            self._commit_pending = True
+            self._tick_blitting = self._tick_blitting or self._blitting
+            return 0
+        return self.present()
+
+    def present(self) -> int:
+        """
+        Merges the layers into the framebuffer and sends the registers that differ from what the boards currently
+        show, also within a tick().
+        :return: number of bytes written to the bus (also stored as self.last_commit_bytes)
+        """
+        blitting = self._blitting or self._tick_blitting
+        self._commit_pending = self._tick_blitting = False
+
+        frame = self._frame
+        shadow = self._shadow
+        segments, leds = self.compositor.compose()
+        frame[0::2] = segments
+        frame[1::2] = b''.join([_LED_BITS[byte] for byte in leds.to_bytes(self.num_boards, 'big')])
+        written = 0
+        if frame != shadow:
+            if self.test_mode:
+                written = sum(new != old for new, old in zip(frame, shadow))
+                shadow[:] = frame
+                self.renderer.render(frame)
+                if not blitting:
+                    # only animation frames are rate limited, the last write of a burst is always shown
+                    self.renderer.flush()
+            else:
+                probe = instrumentation.active
+                start = time.perf_counter_ns() if probe is not None else 0
+                # one write per board, sent as a burst when more than a couple of registers changed
+                with self._bus_lock:
+                    for board in range(self.num_boards):
+                        written += self.TM1638.segments.write_image(board, frame[16 * board:16 * (board + 1)])
+                if probe is not None:
+                    probe.record('bus_write', time.perf_counter_ns() - start)
+
+        self.last_commit_bytes = written
+        if written and self.on_commit is not None:
+            self.on_commit(frame, blitting)
+        return written
 
-    @testing_wrapper(message="<clear display>")
     def clear_display(self):
         """
-        Clears the display
+        Clears the display (and every layer)
+        """
+        self.compositor.clear()
+        self._commit_pending = False
+        self._frame[:] = self._shadow[:] = bytes(len(self._frame))
+        self._clear_boards()
+
+    @testing_wrapper(message="<clear display>", trace_name='clear_display')
+    def _clear_boards(self):
+        """
+        Clears the registers of all boards
         """
-        self.TM1638.clearDisplay()
+        with self._bus_lock:
+            self.TM1638.clearDisplay()
+        self.TM1638.segments._intern[:] = [0] * self.num_segments
 
     def check_button_values(self) -> int:
         """
         Returns the value of any button presses as an integer representation of a byte
             e.g. second button from right -> 00000010 = 2
+        While the key scan is running, the debounced state of the scan is returned without reading the board.
+        Each board read is followed by a pause of key_read_pause seconds (none on virtual boards).
         :return: integer of pressed button(s)
         """
-        buttons_pressed = []
-        for button in range(self.num_segments):
-            buttons_pressed.append(str(int(self.switches[button])))
+        if self.key_scanner is not None:
+            return self.key_scanner.mask
 
-        buttons_str = ''.join(buttons_pressed)
-        button_int = int(buttons_str, 2)
+        button_int = self.read_button_values()
 
-        # sleep 0.05 prevents the board getting confused
-        time.sleep(0.05)
+        # a pause between the reads prevents the board getting confused (see KEY_READ_PAUSE)
+        if self.key_read_pause:
+            time.sleep(self.key_read_pause)
         return button_int
+
+    def read_button_values(self) -> int:
+        """
+        Reads the button presses like check_button_values(), without the pause between reads. The caller is
+        responsible for spacing the reads (e.g. the poll interval of the async game engine).
+        :return: integer of pressed button(s)
+        """
+        # one key-scan transaction per board
+        with self._bus_lock:
+            return self.switches.mask()
+
+    def start_key_scan(self,
+                       scan_rate: float = 200,
+                       debounce: float = 0.01) -> 'KeyScanner':
+        """
+        Starts reading the buttons from a background thread. Debounced press / release events (with monotonic
+        timestamps) are queued in key_scanner.events for the game loop to drain.
+        :param scan_rate: button reads per second
+        :param debounce: seconds a change must be stable before it is reported
+        :return: the running key scanner
+        """
+        from .key_scanner import KeyScanner
+
+        self.stop_key_scan()
+        self.key_scanner = KeyScanner(self.read_button_values, scan_rate, debounce)
+        self.key_scanner.start()
+        return self.key_scanner
+
+    def stop_key_scan(self) -> None:
+        """
+        Stops the background button reads
+        """
+        if self.key_scanner is not None:
+            self.key_scanner.stop()
+            self.key_scanner = None
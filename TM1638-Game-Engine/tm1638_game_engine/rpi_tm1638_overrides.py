@@ -23,60 +23,156 @@ Classes given below are modifications of the TM1638 library written by Mike Caus
     https://github.com/mcauser/micropython-tm1638
 """
 
-from rpi_TM1638.TMBoards import TMBoards
-from rpi_TM1638.TMBoards import Segments
-# from drivers.rpi_TM1638.TMBoards import Segments
+from . import instrumentation
+from .seg_font import encode_line
+
+
+# bit order reversal of every byte (the key-scan bits are decoded with the first switch as bit 0)
+_REVERSED_BITS = bytes(int(f'{byte:08b}'[::-1], 2) for byte in range(256))
 
 
 class SegmentsOverride(object):
 	"""
 	Class to extend manipulation of the 7-segment displays on the chained TM Boards.
-	Wraps the Segments class to enable direct value writes to the segments (this allows individual LEDs
+	Replaces the Segments class to enable direct value writes to the segments (this allows individual LEDs
 	within the segments to be illuminated even if the value does not represent a character or symbol).
+	Characters are encoded with the shared font table (see seg_font.py).
 	"""
 	def __init__(self, TM):
 		"""Initialize the Segment object"""
 		self._TM = TM
-		self._base_segments = Segments(self._TM)
-		self._intern = self._base_segments._intern
+		self._intern = [0] * (8 * self._TM.nbBoards)
+		# register image of every board as last sent (segment values at even addresses, LEDs at odd addresses)
+		self.registers = bytearray(16 * self._TM.nbBoards)
+		# use the driver's own burst write if it has one
+		self._send_burst = getattr(self._TM, 'sendBurst', self._gpio_burst)
 
 	def __setitem__(self, index, value):
 		"""
-		Extends Segments.__setitem__() to enable writing specified (unmapped) values directly to the segment
+		Mirrors Segments.__setitem__() and enables writing specified (unmapped) values directly to the segment
 		displays.
 
 		:param index: index of the 7-segment, or tuple (i,j)
-		:param value: string (or one-character string) when index is a int, otherwise a boolean
+		:param value: string (or list of unmapped values) when index is a int, otherwise a boolean
+		"""
+		if isinstance(index, int):
+			# encode the characters (unmapped values are kept as they are) into a copy of the register image
+			values = encode_line(value)
+			image = bytearray(self.registers)
+			stop = index + len(values)
+			image[2 * index:2 * stop:2] = values
+			# send every board the values land on
+			for board in range(index // 8, (stop - 1) // 8 + 1):
+				self.write_image(board, image[16 * board:16 * (board + 1)])
+
+		elif isinstance(index, (list, tuple)):
+			# get the 7-segment display index and the led index
+			i, j = index
+			# determine the new intern value
+			if value:
+				self._intern[i] |= 1 << j
+			else:
+				self._intern[i] &= ~(1 << j)
+			self.registers[2 * i] = self._intern[i]
+			# send the data to the TM
+			self._TM.sendData((i % 8) * 2, self._intern[i], i // 8)
+			probe = instrumentation.active
+			if probe is not None:
+				probe.count('bus_writes')
+				probe.count('bus_bytes')
+
+	def write_image(self, board, image):
+		"""
+		Writes a 16 register display image (segment values at even addresses, LEDs at odd addresses) to a board.
+		Only the registers that differ from what the board shows are sent: one or two changes are sent as single
+		address writes, anything more as one auto-increment burst spanning the first to the last changed register.
+
+		:param board: index of the board in the chain
+		:param image: the 16 register values for the board
+		:return: number of data bytes sent
+		"""
+		offset = 16 * board
+		current = self.registers[offset:offset + 16]
+		if current == image:
+			return 0
+
+		changed = [addr for addr in range(16) if image[addr] != current[addr]]
+		if len(changed) <= 2:
+			for addr in changed:
+				self._TM.sendData(addr, image[addr], board)
+			written = writes = len(changed)
+		else:
+			first = changed[0]
+			last = changed[-1] + 1
+			self._send_burst(first, image[first:last], board)
+			written = last - first
+			writes = 1
+
+		probe = instrumentation.active
+		if probe is not None:
+			probe.count('bus_writes', writes)
+			probe.count('bus_bytes', written)
+
+		# store the new register and intern values
+		self.registers[offset:offset + 16] = image
+		self._intern[8 * board:8 * (board + 1)] = image[0::2]
+		return written
+
+	def _gpio_burst(self, addr, data, TMindex):
+		"""
+		Sends consecutive register values in a single transaction using the TM1638 automatic address increment.
+
+		:param addr: address of the first register
+		:param data: values of the registers from addr onwards
+		:param TMindex: index of the board in the chain
+		"""
+		# only drivers without a burst write need GPIO (keeps the overrides usable with the virtual boards)
+		import RPi.GPIO as GPIO
+
+		# data command: write to the display registers with automatic address increment
+		self._TM.sendCommand(0x40, TMindex)
+		GPIO.output(self._TM.stb[TMindex], False)
+		self._TM._sendByte(0xC0 | addr)
+		for val in data:
+			self._TM._sendByte(val)
+		GPIO.output(self._TM.stb[TMindex], True)
+
+
+class SwitchesOverride(object):
+	"""
+	Replaces the Switches class to read all the switches of a board in a single key-scan transaction instead of
+	one transaction per switch.
+	"""
+	def __init__(self, TM):
+		"""Initialize the Switches object"""
+		self._TM = TM
+
+	def __getitem__(self, index):
+		"""
+		Returns the value of the switch #index (as Switches.__getitem__())
+
+		:param index: index of the switch in the chain
+		"""
+		return bool(self.board_mask(index // 8) & (0x80 >> (index % 8)))
+
+	def board_mask(self, board):
+		"""
+		Reads the 4 key-scan bytes of a board in one transaction and decodes them into the integer of pressed
+		switches (first switch = most significant bit).
+
+		:param board: index of the board in the chain
+		"""
+		b0, b1, b2, b3 = self._TM.getData(board)
+		# switch n is bit 0 (n < 4) or bit 4 (n >= 4) of key-scan byte n % 4
+		keys = (b0 & 0x11) | (b1 & 0x11) << 1 | (b2 & 0x11) << 2 | (b3 & 0x11) << 3
+		return _REVERSED_BITS[keys]
+
+	def mask(self):
+		"""
+		Reads every board and returns the integer of pressed switches for the whole chain (first switch of the first
+		board = most significant bit).
 		"""
-		try:
-			self._base_segments[index] = value
-
-		except ValueError:
-
-
-			if isinstance(index, int):
-				# parse string to transform it in list of 8-bit int to send to the TM1638
-				# -> allows to parse the '.' characters
-				lv = []
-				for c in value:
-					lv.append(c)
-				# send every display if something has changed
-				for val in lv:
-					# check if something change (otherwise do not send data, it's useless)
-					if self._intern[index] != val:
-						# store the new intern value
-						self._intern[index] = val
-						# send the data to the TM
-						self._TM.sendData((index % 8) * 2, val, index // 8)
-					index += 1
-
-			elif isinstance(index, (list, tuple)):
-				# get the 7-segment display index and the led index
-				i, j = index
-				# determine the new intern value
-				if value:
-					self._intern[i] |= 1 << j
-				else:
-					self._intern[i] &= ~(1 << j)
-				# send the data to the TM
-				self._TM.sendData((i % 8) * 2, self._intern[i], i // 8)
\ No newline at end of file
+		value = 0
+		for board in range(self._TM.nbBoards):
+			value = value << 8 | self.board_mask(board)
+		return value
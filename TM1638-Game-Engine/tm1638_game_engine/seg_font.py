@@ -0,0 +1,81 @@
+"""
+Compiled 7-segment font shared by the TM1638 drivers and the display mock-up.
+
+Segment values use the TM1638 bit order:
+    bit:      7    6    5    4    3    2    1    0
+    segment: [dot, m,   tl,  bl,  b,   br,  tr,  t]
+
+Letters are case-insensitive. A '.' is folded into the character before it (e.g. '1.5' uses two displays); a '.'
+that cannot be folded is displayed as a blank display with its dot lit.
+"""
+from typing import List, Optional, Union
+
+DOT: int = 0x80
+
+_GLYPHS = {
+    ' ': 0x00, '-': 0x40, '_': 0x08, '=': 0x48, '"': 0x22, "'": 0x20, '[': 0x39, ']': 0x0F, '.': DOT,
+    '0': 0x3F, '1': 0x06, '2': 0x5B, '3': 0x4F, '4': 0x66, '5': 0x6D, '6': 0x7D, '7': 0x07, '8': 0x7F, '9': 0x6F,
+    'a': 0x77, 'b': 0x7C, 'c': 0x39, 'd': 0x5E, 'e': 0x79, 'f': 0x71, 'g': 0x3D, 'h': 0x76, 'i': 0x30,
+    'j': 0x1E, 'k': 0x75, 'l': 0x38, 'm': 0x15, 'n': 0x54, 'o': 0x5C, 'p': 0x73, 'q': 0x67, 'r': 0x50,
+    's': 0x6D, 't': 0x78, 'u': 0x3E, 'v': 0x1C, 'w': 0x2A, 'x': 0x76, 'y': 0x6E, 'z': 0x5B,
+}
+
+
+def _compile_font() -> bytearray:
+    """
+    Builds the 256 entry character code -> segment value table
+    """
+    table = bytearray(256)
+    for char, value in _GLYPHS.items():
+        table[ord(char)] = value
+        table[ord(char.upper())] = value
+    return table
+
+
+FONT_TABLE: bytes = bytes(_compile_font())
+SUPPORTED_CHARS: bytes = bytes(code for code in range(256) if FONT_TABLE[code] or code == ord(' '))
+
+_DOT_CHAR: int = ord('.')
+
+
+def encode_line(line: Union[str, List, float],
+                width: Optional[int] = None) -> bytes:
+    """
+    Encodes a display line to segment values in a single pass over the font table.
+
+    :param line: the line to encode:
+        • a string (or number) of displayable characters
+        • a list of single characters
+        • a list (or bytes) of unmapped segment values, which are used as they are
+    :param width: if given, lines shorter than this are padded with blank displays
+    :return: one segment value per display
+    """
+    if isinstance(line, (bytes, bytearray)):
+        encoded = bytes(line)
+    elif isinstance(line, (list, tuple)) and (not line or isinstance(line[0], int)):
+        encoded = bytes(line)
+    else:
+        if isinstance(line, (list, tuple)):
+            line = ''.join(line)
+        elif not isinstance(line, str):
+            line = str(line)
+
+        raw = line.encode('latin-1', 'replace')
+        unsupported = raw.translate(None, SUPPORTED_CHARS)
+        if unsupported:
+            raise ValueError(f"Unsupported character(s) passed in line: {unsupported.decode('latin-1')}")
+
+        if _DOT_CHAR in raw:
+            folded = bytearray()
+            for char in raw:
+                if char == _DOT_CHAR and folded and not folded[-1] & DOT:
+                    folded[-1] |= DOT
+                else:
+                    folded.append(FONT_TABLE[char])
+            encoded = bytes(folded)
+        else:
+            encoded = raw.translate(FONT_TABLE)
+
+    if width is not None and len(encoded) < width:
+        encoded += bytes(width - len(encoded))
+    return encoded
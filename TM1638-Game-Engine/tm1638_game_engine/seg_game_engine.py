@@ -17,16 +17,83 @@ Copyright (C) 2023  James Kano
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from inspect import getfullargspec
+import random
+from collections import deque
+from functools import partial
 from random import randint
-from time import sleep
-from typing import Any, Callable, Dict, List, Optional
+from time import monotonic, perf_counter_ns, sleep
+from typing import Any, Callable, Deque, Dict, Generator, List, Optional, Tuple, Union
 
 from .rpi_tm1638_animations import TM1638Animated
-from .decorators import testing_wrapper
+from .decorators import TestModeAttribute, testing_wrapper
+from . import instrumentation
+from .frame_scheduler import Animation, pause
+from .input_decoder import CHORD, PRESS, InputDecoder, InputEvent
+from .puzzle_pool import PuzzlePool
+
+
+# values that can be injected into MiniGame callbacks by argument name, as getters of (game, turn input)
+_INJECTABLE_VALUES: Dict[str, Callable[['MiniGame', Any], Any]] = {
+    'input_button': lambda game, input_button: input_button,
+    'progress': lambda game, input_button: game._progress,
+    'tm1638': lambda game, input_button: game.tm1638,
+    'input_event': lambda game, input_button: game.last_input_event,
+    'rng': lambda game, input_button: game.rng,
+    'correct_answer_conditions': lambda game, input_button: game.correct_answer_conditions,
+}
+
+# call plan: the (argument name, value getter) pairs to be passed to a callback
+CallPlan = Tuple[Tuple[str, Callable[['MiniGame', Any], Any]], ...]
+
+
+def _arg_names(callback: Callable) -> Tuple[str, ...]:
+    """
+    Names of the positional arguments of a callback (read from its code, inspect is only loaded for other callables)
+    """
+    code = getattr(getattr(callback, '__func__', callback), '__code__', None)
+    if code is None:
+        from inspect import getfullargspec
+        return tuple(getfullargspec(callback).args)
+    return code.co_varnames[:code.co_argcount]
+
+
+class _Callback:
+    """
+    Descriptor for the MiniGame callback attributes. The arguments of a callback are resolved once, when it is
+    assigned, into a cached call plan, so that a turn only pays for the call itself.
+    """
+    def __set_name__(self, owner, name: str) -> None:
+        self.name: str = name
+
+    def __get__(self, game, owner=None) -> Optional[Callable]:
+        if game is None:
+            return self
+        return game.__dict__['_callbacks'].get(self.name) if '_callbacks' in game.__dict__ else None
+
+    def __set__(self, game, callback: Optional[Callable]) -> None:
+        game.__dict__.setdefault('_callbacks', {})[self.name] = callback
+        plans = game.__dict__.setdefault('_call_plans', {})
+        if callback is None:
+            plans.pop(self.name, None)
+        else:
+            args = _arg_names(callback)
+            if self.name == 'map_input':
+                # map_input receives the instance attributes named by its arguments (plan of names only)
+                plans[self.name] = tuple(args)
+            else:
+                plans[self.name] = tuple((arg, _INJECTABLE_VALUES[arg]) for arg in args if arg in _INJECTABLE_VALUES)
 
 
 class MiniGame:
+    # callbacks (see __init__), each with a cached call plan
+    puzzle_generator = _Callback()
+    setup_routine = _Callback()
+    map_input = _Callback()
+    correct_answer_action = _Callback()
+    incorrect_answer_action = _Callback()
+    # _lose_screen picks its test implementation according to this flag
+    test_mode = TestModeAttribute()
+
     def __init__(self,
                  win_length: int,
                  tm1638: TM1638Animated = None,
@@ -37,7 +104,11 @@ class MiniGame:
                  show_button_feedback: bool = True,
                  correct_answer_action: Callable = None,
                  incorrect_answer_action: Callable = None,
-                 test_mode: bool=False
+                 test_mode: bool=False,
+                 input_kinds: Tuple[str, ...] = (PRESS,),
+                 rng: Optional[random.Random] = None,
+                 error_pause: float = 1,
+                 puzzle_generator: Callable = None
                  ) -> None:
         """
         MiniGame class creates a standard design pattern for ease of creating multiple games and running them
@@ -50,9 +121,15 @@ class MiniGame:
         :param win_length: Number of steps / turns required to complete the game
         :param setup_routine: Function to set up a MiniGame
             • This may take an argument of 'tm1638', the tm1638 object to be used
+            • This may take an argument of 'rng', the random number generator of the game
             • This may return:
                 - a list (or iterable) of correct_answer_conditions
                 - the starting display for the segments
+                - an 'intro_animation' (Animation or list of Animations, see tm1638.play_frames(block=False)) to be
+                  played by the game loop before the game starts, instead of blocking in the setup routine
+                - the 'win_length', if it depends on the generated answers
+            • With a puzzle_generator, the setup routine runs after the puzzle is set and only needs to return the
+              presentation (e.g. the 'intro_animation'). It may take an argument of 'correct_answer_conditions'.
         :param correct_answer_conditions: List of correct answers (typically list of ints)
             • This may be determined randomly by the setup routine. If so, the setup_routine() should return the correct
             answer list, which will be stored to self.correct_answer_conditions
@@ -67,10 +144,27 @@ class MiniGame:
             • Returns the updated segment display
         :param incorrect_answer_action: Function for incorrect action response (life decrement is handled automatically)
             • Returns the updated progress
+            • Its display is shown for error_pause seconds before the game screen
+        :param input_kinds: The kinds of input event (see input_decoder.py) that play a turn, by default only single
+            button presses. Games opting into 'chord' receive the tuple of button numbers as input when
+            input_as_linear_int is set (to be mapped by map_input). Callbacks may take an 'input_event' argument to
+            receive the InputEvent of the turn.
+        :param rng: random number generator of the game (random.Random or the random module), the random module by
+            default. Give the game its own seeded random.Random to make it reproducible (see simulation.py).
+        :param error_pause: Seconds the error screen is shown after an incorrect answer
+        :param puzzle_generator: Function generating the puzzle data of a round, returned as the setup_routine
+            would ('correct_answer_conditions', 'game_seg_display', 'game_LED_display', 'win_length')
+            • This may take the arguments 'rng' and 'tm1638' (only to read its sizes)
+            • It must not draw on the display. A generator taking 'rng' may run on a background thread (see
+              puzzle_pool.py), the puzzles of the next rounds being generated while a round is played; the others
+              are run on the game thread, as they draw on the shared random module
         """
         self.tm1638 = tm1638
 
+        self.puzzle_generator: Callable = puzzle_generator
         self.setup_routine: Callable = setup_routine
+        # if set, gives the generated puzzles (e.g. PuzzlePool.take) instead of generating them in setup()
+        self.puzzle_source: Optional[Callable[[], Dict[str, Any]]] = None
 
         # store conditions and actions for correct answers
         self.correct_answer_conditions: List[Optional[int]] = correct_answer_conditions
@@ -79,10 +173,17 @@ class MiniGame:
         self.incorrect_answer_action: Callable = incorrect_answer_action
 
         # UI variables
+        self.intro_animation: Optional[Union[Animation, List[Animation]]] = None
         self.game_seg_display: List[Any] = None
         self.game_LED_display: int = 0
         self.show_button_feedback: bool = show_button_feedback
         self.input_as_linear_int: bool = input_as_linear_int
+        self.input_kinds: Tuple[str, ...] = input_kinds
+        self.last_input_event: Optional[InputEvent] = None
+        self.rng: Union[random.Random, Any] = rng if rng is not None else random
+        self.error_pause: float = error_pause
+        # waits for the error pause of the turns (e.g. skipped by a replay at maximum speed)
+        self.sleep: Callable[[float], Any] = sleep
 
         # monitoring variables
         self._win_length: int = win_length
@@ -100,19 +201,43 @@ class MiniGame:
         _continue_loop = self._alive and not self._show_final_display
         return _continue_loop
 
+    @property
+    def pregenerable(self) -> bool:
+        """
+        Whether the puzzles can be generated in advance on a background thread (see puzzle_pool.py): the
+        puzzle_generator draws from the 'rng' it is given rather than from the shared random module
+        """
+        return self.puzzle_generator is not None and \
+            any(arg == 'rng' for arg, _ in self._call_plans['puzzle_generator'])
+
+    @property
+    def win_length(self) -> int:
+        """
+        Number of steps / turns required to complete the game
+        """
+        return self._win_length
+
+    @win_length.setter
+    def win_length(self, win_length: int) -> None:
+        self._win_length = win_length
+
     def setup(self) -> None:
         """
         Setup actions for the MiniGme.
             Note: By default this is not called during class initiation to save memory when multiple MiniGame instances
             are registered.
         """
+        # set the puzzle, generated in advance if possible
+        if self.puzzle_generator is not None:
+            puzzle = self.puzzle_source() if self.puzzle_source is not None else self.generate_puzzle()
+            for attr, value in puzzle.items():
+                setattr(self, attr, value)
+
         # run the setup routine
+        self.intro_animation = None
         if self.setup_routine is not None:
             # inject any required self-stored objects into the function
-            setup_routine_args = getfullargspec(self.setup_routine)._asdict()['args']
-            setup_kwargs = {}
-            if 'tm1638' in setup_routine_args:
-                setup_kwargs['tm1638'] = self.tm1638
+            setup_kwargs = self._plan_kwargs('setup_routine', None)
 
             # run the setup routine
             attr_dict = self.setup_routine(**setup_kwargs)
@@ -123,14 +248,37 @@ class MiniGame:
             f"The Game has {self._win_length} completion steps and {self.correct_answer_conditions} step answers. " \
             f"This game may be unplayable!"
 
+    def generate_puzzle(self,
+                        rng: Optional[random.Random] = None) -> Dict[str, Any]:
+        """
+        Generates the puzzle data of a round with the puzzle_generator, without setting it.
+
+        :param rng: random number generator to generate with (the game's rng by default)
+        :return: the game attributes of the puzzle
+        """
+        kwargs = self._plan_kwargs('puzzle_generator', None)
+        if rng is not None and 'rng' in kwargs:
+            kwargs['rng'] = rng
+        return self.puzzle_generator(**kwargs)
+
+    def _plan_kwargs(self,
+                     callback_name: str,
+                     input_button: Any) -> Dict[str, Any]:
+        """
+        Builds the keyword arguments of a callback from its cached call plan.
+
+        :param callback_name: name of the callback attribute
+        :param input_button: the turn input, for callbacks taking 'input_button'
+        """
+        return {arg: get_value(self, input_button) for arg, get_value in self._call_plans[callback_name]}
 
     @testing_wrapper(message="Game lost!")
     def _lose_screen(self) -> None:
         """
         Displays the game-over screen.
         """
-        self.tm1638.LEDs(255)
-        self.tm1638.display_line('88888888')
+        self.tm1638.LEDs((1 << self.tm1638.num_leds) - 1)
+        self.tm1638.display_line('8' * self.tm1638.num_segments)
         pass
 
     # @testing_wrapper(message="--SAFE--")
@@ -143,17 +291,32 @@ class MiniGame:
     def _input_to_linear_int(self,
                              input_button: int) -> int:
         """
-        Coverts the binary integer of the button input to a linear integer
+        Coverts the binary integer of the button input to a linear integer (button number from the left)
         """
-        linear_int = None
-        for i in range(self.tm1638.num_leds + 1):
-            if input_button == (1 << i):
-                linear_int = i
+        linear_int = self.tm1638.num_segments - input_button.bit_length()
 
         if self.test_mode:
-            print(f"{input_button} converted to: {linear_int}")
+            from .display_mocks import print_message
+
+            print_message(f"{input_button} converted to: {linear_int}")
+
+        return linear_int
+
+    def answer_for(self,
+                   input_button: int) -> Any:
+        """
+        Returns the answer a button input would be compared with by a turn (button number and map_input applied),
+        without playing the turn. map_input must not be a coroutine function.
 
-        return self.tm1638.num_segments - linear_int - 1
+        :param input_button: Integer of the button input
+        """
+        if self.input_as_linear_int:
+            input_button = self.tm1638.num_segments - input_button.bit_length()
+        if self.map_input:
+            attrs = self.__dict__
+            input_button = self.map_input(input_button,
+                                          **{arg: attrs[arg] for arg in self._call_plans['map_input'] if arg in attrs})
+        return input_button
 
     def final_display(self,
                       set_lose: bool = False) -> None:
@@ -175,8 +338,89 @@ class MiniGame:
         """
         Plays a turn.
 
-        :param input_button: The switch input number as an int
+        :param input_button: The switch input number as an int, or an InputEvent
         """
+        probe = instrumentation.active
+        if probe is not None:
+            self._play_probed(input_button, probe)
+            return
+
+        turn = self._turn(input_button)
+        result = None
+        try:
+            while True:
+                callback, args, kwargs = turn.send(result)
+                result = callback(*args, **kwargs)
+        except StopIteration:
+            pass
+
+    def _play_probed(self,
+                     input_button: Union[int, InputEvent],
+                     probe: instrumentation.Instrumentation) -> None:
+        """
+        play() timing the turn and each callback
+        """
+        turn_start = perf_counter_ns()
+        turn = self._turn(input_button)
+        result = None
+        try:
+            while True:
+                callback, args, kwargs = turn.send(result)
+                start = perf_counter_ns()
+                result = callback(*args, **kwargs)
+                probe.record('callback', perf_counter_ns() - start)
+        except StopIteration:
+            pass
+        probe.record('turn', perf_counter_ns() - turn_start)
+
+    async def play_async(self, input_button: int) -> None:
+        """
+        Plays a turn, awaiting any callback (map_input, correct_answer_action, incorrect_answer_action) that is a
+        coroutine function or returns an awaitable.
+
+        :param input_button: The switch input number as an int, or an InputEvent
+        """
+        import asyncio
+        from inspect import isawaitable
+
+        probe = instrumentation.active
+        turn_start = perf_counter_ns() if probe is not None else 0
+        turn = self._turn(input_button)
+        result = None
+        try:
+            while True:
+                callback, args, kwargs = turn.send(result)
+                if callback is sleep:
+                    # do not block the event loop
+                    result = await asyncio.sleep(*args)
+                    continue
+                start = perf_counter_ns() if probe is not None else 0
+                result = callback(*args, **kwargs)
+                if isawaitable(result):
+                    result = await result
+                if probe is not None:
+                    probe.record('callback', perf_counter_ns() - start)
+        except StopIteration:
+            pass
+        if probe is not None:
+            probe.record('turn', perf_counter_ns() - turn_start)
+
+    def _turn(self, input_button: Union[int, InputEvent]) -> Generator[Tuple[Callable, tuple, dict], Any, None]:
+        """
+        The logic of a turn. Callbacks are not called directly but yielded as (callback, args, kwargs), their result
+        being sent back, so that play() and play_async() share the same turn logic.
+
+        :param input_button: The switch input number as an int, or an InputEvent
+        """
+        event = None
+        if isinstance(input_button, InputEvent):
+            # inputs the game has not opted into are ignored
+            if input_button.kind not in self.input_kinds:
+                return
+            event = input_button
+            input_button = event.mask
+        self.last_input_event = event
+
         # lock the game loop if won or lost
         if self._show_final_display:
             self.final_display()
@@ -184,38 +428,29 @@ class MiniGame:
 
         # take action according to the turn input
         if self.input_as_linear_int:
-            input_button = self._input_to_linear_int(input_button)
+            if event is None:
+                input_button = self._input_to_linear_int(input_button)
+            else:
+                input_button = event.buttons if event.kind == CHORD else event.button
         if self.map_input:
-            map_input_args = getfullargspec(self.map_input)._asdict()['args']
-            map_input_kwargs = {arg: getattr(self, arg) for arg in map_input_args
-                                if arg in self.__dict__}
-            input_button = self.map_input(input_button, **map_input_kwargs)
+            attrs = self.__dict__
+            map_input_kwargs = {arg: attrs[arg] for arg in self._call_plans['map_input'] if arg in attrs}
+            input_button = yield self.map_input, (input_button,), map_input_kwargs
         if int(input_button) == int(self.correct_answer_conditions[self._progress]):
             self._progress += 1
             if self.correct_answer_action is not None:
-                action_kwargs = {}
-                correct_answer_action_args = getfullargspec(self.correct_answer_action)._asdict()['args']
-                if 'input_button' in correct_answer_action_args:
-                    action_kwargs['input_button'] = input_button
-                if 'progress' in correct_answer_action_args:
-                    action_kwargs['progress'] = self._progress
-                if 'tm1638' in correct_answer_action_args:
-                    action_kwargs['tm1638'] = self.tm1638
-                self.game_seg_display = self.correct_answer_action(**action_kwargs)
+                action_kwargs = self._plan_kwargs('correct_answer_action', input_button)
+                self.game_seg_display = yield self.correct_answer_action, (), action_kwargs
         else:
             if self.incorrect_answer_action is not None:
-                action_kwargs = {}
-                incorrect_answer_action_args = getfullargspec(self.incorrect_answer_action)._asdict()['args']
-                if 'input_button' in incorrect_answer_action_args:
-                    action_kwargs['input_button'] = input_button
-                if 'progress' in incorrect_answer_action_args:
-                    action_kwargs['progress'] = self._progress
-                if 'tm1638' in incorrect_answer_action_args:
-                    action_kwargs['tm1638'] = self.tm1638
-                self._progress = self.incorrect_answer_action(**action_kwargs)
+                action_kwargs = self._plan_kwargs('incorrect_answer_action', input_button)
+                self._progress = yield self.incorrect_answer_action, (), action_kwargs
             else:
                 self.tm1638.display_line("Error")
-                sleep(1)
+            if self.error_pause:
+                # the error screen is sent before the pause, even within a tick
+                self.tm1638.present()
+                yield self.sleep, (self.error_pause,), {}
             self._lives -= 1
 
         # take action if the game has been won or lost
@@ -237,7 +472,10 @@ class SevenSegButtonGame:
                  stb: int,
                  clk: int,
                  dio: int,
-                 test_mode: bool = False) -> None:
+                 test_mode: bool = False,
+                 key_scan_rate: Optional[float] = None,
+                 device: Optional[object] = None,
+                 pregenerate_puzzles: int = 1) -> None:
         """
         7-segment button game main class
 
@@ -247,15 +485,23 @@ class SevenSegButtonGame:
         :param stb: Specifies the stb pin number
         :param clk: Specifies the clk pin number
         :param dio: Specifies the dio pin number
+        :param key_scan_rate: If given, the buttons are read (and debounced) by a background thread at this rate
+            and the loops take the queued press events instead of reading the board
+        :param device: driver used instead of the rpi_TM1638 boards (e.g. VirtualTMBoards for headless runs)
+        :param pregenerate_puzzles: number of puzzles generated in advance, on a background thread, for each game
+            with a puzzle_generator taking 'rng' (0 generates them in MiniGame.setup())
         """
         self.tm: TM1638Animated = TM1638Animated(stb=stb,
                                                  clk=clk,
                                                  dio=dio,
                                                  brightness=4,
-                                                 test_mode=test_mode)
+                                                 test_mode=test_mode,
+                                                 device=device)
 
-        self._game_register: Dict[str, MiniGame] = {}
+        # registered games, or the functions creating them until they are selected
+        self._game_register: Dict[str, Union[MiniGame, Callable[[TM1638Animated], MiniGame]]] = {}
         self.selected_game: Optional[MiniGame] = None
+        self.puzzle_pool: Optional[PuzzlePool] = PuzzlePool(pregenerate_puzzles) if pregenerate_puzzles else None
 
         # internal monitoring variables
         self._game_select: int = 0
@@ -264,29 +510,100 @@ class SevenSegButtonGame:
         # standby variables
         self.in_standby: bool = True
         self._standby_presses: int = 0
+        # the second button of the first board starts the selected game (64 on a single board)
+        self.standby_button: int = 1 << (self.tm.num_segments - 2)
 
         # internal input monitoring variables
-        self._is_pressed: bool = False
+        self.input_decoder: InputDecoder = InputDecoder(self.tm.num_segments)
+        self._input_events: Deque[InputEvent] = deque()
+        # key scan events dropped by a full ring so far (see _next_input_event)
+        self._dropped_key_events: int = 0
+        self.last_input_time: Optional[float] = None
+        # if set, replaces tm.check_button_values() to read the buttons (e.g. to replay a recorded session)
+        self.read_buttons: Optional[Callable[[], int]] = None
+        # receives every raw button reading (see session_recorder.py)
+        self.recorder: Optional[Any] = None
+        if key_scan_rate:
+            self.tm.start_key_scan(key_scan_rate)
+
+        # animations played (one frame per loop call) by the loops while they keep polling the buttons
+        self._animations: Deque[Animation] = deque()
+        self._game_display_pending: bool = False
+        # clock the animations are stepped with (e.g. run ahead by a replay at maximum speed)
+        self.clock: Callable[[], float] = monotonic
 
         self.test_mode = test_mode
 
     def register_game(self,
                       game_title: str,
-                      game_object: MiniGame) -> None:
+                      game_object: Union[MiniGame, Callable[[TM1638Animated], MiniGame]]) -> None:
         """
         Enables the main object to register
 
         :param game_title: String of the game's name
-        :param game_object: MiniGame object containing the game instance
+        :param game_object: MiniGame object containing the game instance, or a function creating it from the tm1638
+            interface (only called if the game is selected, which keeps the start up fast)
         """
         assert not self._setup_run, "Games may not be registered after setup() is called"
         self._game_register[game_title] = game_object
+        if isinstance(game_object, MiniGame):
+            self._attach_game(game_object)
 
+    def _attach_game(self,
+                     game_object: MiniGame) -> None:
+        """
+        Gives a registered game the tm1638 interface and test mode of the main object
+        """
         if game_object.tm1638 is None:
             game_object.tm1638 = self.tm
 
         game_object.test_mode = self.test_mode
 
+    def _build_game(self,
+                    game_title: str) -> MiniGame:
+        """
+        Returns a registered game, creating it if it was registered as a function
+        """
+        game_object = self._game_register[game_title]
+        if not isinstance(game_object, MiniGame):
+            game_object = self._game_register[game_title] = game_object(self.tm)
+            self._attach_game(game_object)
+        return game_object
+
+    def play_animation(self,
+                       animation: Optional[Union[Animation, List[Animation]]]) -> None:
+        """
+        Queues animation(s) to be played by standby_start_loop() / game_loop() without blocking input polling.
+        A button press cancels the playing animation if it is cancellable (the press is not passed on).
+
+        :param animation: Animation, list of Animations or None (ignored)
+        """
+        if isinstance(animation, (list, tuple)):
+            for anim in animation:
+                self.play_animation(anim)
+        elif animation is not None:
+            self._animations.append(animation)
+
+    def _step_animations(self,
+                         player_input: int) -> bool:
+        """
+        Advances the queued animations by (at most) one frame.
+
+        :param player_input: the button input of this loop call, used to cancel cancellable animations
+        :return: True if animations were playing (the input has been used by the animations)
+        """
+        if not self._animations:
+            return False
+        now = self.clock()
+        while self._animations:
+            animation = self._animations[0]
+            if player_input and animation.cancellable:
+                animation.cancel()
+            if animation.step(now):
+                break
+            self._animations.popleft()
+        return True
+
     def _check_new_input(self) -> int:
         """
         This function gets the button input, but prevents single presses from being registered multiple times. While a
@@ -294,14 +611,65 @@ class SevenSegButtonGame:
 
         :return: Integer of allowed button input
         """
-        key_pressed = self.tm.check_button_values()
-        if key_pressed > 0 and not self._is_pressed:
-            self._is_pressed = True
-            return key_pressed
-        elif key_pressed == 0 and self._is_pressed:
-            self._is_pressed = False
+        return self._press_mask(self._next_input_event())
+
+    @staticmethod
+    def _press_mask(event: Optional[InputEvent]) -> int:
+        """
+        Integer of the buttons of a new press or chord (0 for no event, long presses and repeats)
+        """
+        if event is not None and event.kind in (PRESS, CHORD):
+            return event.mask
         return 0
 
+    def _next_input_event(self,
+                          read_buttons: Optional[Callable[[], int]] = None) -> Optional[InputEvent]:
+        """
+        Gets the next decoded input event. The buttons are read (or the key scan events drained) only once the
+        events of previous reads have all been handled.
+
+        :param read_buttons: function reading the buttons, self.read_buttons or tm.check_button_values() by default
+        :return: the next InputEvent or None
+        """
+        probe = instrumentation.active
+        start = perf_counter_ns() if probe is not None else 0
+
+        if not self._input_events:
+            scanner = self.tm.key_scanner
+            if scanner is not None:
+                key_event = scanner.events.pop()
+                while key_event is not None:
+                    if self.recorder is not None:
+                        self.recorder.record_input(key_event.mask)
+                    self._input_events.extend(self.input_decoder.update(key_event.mask, key_event.timestamp))
+                    key_event = scanner.events.pop()
+                if scanner.events.dropped != self._dropped_key_events:
+                    # changes were lost in a full ring (e.g. a release, which would leave the decoder held): catch
+                    # up with the debounced state of the buttons
+                    self._dropped_key_events = scanner.events.dropped
+                    if self.recorder is not None:
+                        self.recorder.record_input(scanner.mask)
+                    self._input_events.extend(self.input_decoder.update(scanner.mask, monotonic()))
+                hold_event = self.input_decoder.tick(monotonic())
+                if hold_event is not None:
+                    self._input_events.append(hold_event)
+            else:
+                key_pressed = (read_buttons or self.read_buttons or self.tm.check_button_values)()
+                if self.recorder is not None:
+                    self.recorder.record_input(key_pressed)
+                self._input_events.extend(self.input_decoder.update(key_pressed, monotonic()))
+
+        event = self._input_events.popleft() if self._input_events else None
+        if event is not None:
+            self.last_input_time = event.timestamp
+        if probe is not None:
+            probe.record('input_poll', perf_counter_ns() - start)
+            if event is not None:
+                probe.count('input_events')
+                if event.kind in (PRESS, CHORD):
+                    probe.count('presses_handled')
+        return event
+
     def select_game(self,
                     selected_game_name: str = None) -> None:
         """
@@ -314,11 +682,23 @@ class SevenSegButtonGame:
             selected_game_name = list(self._game_register.keys())[self._game_select]
 
         self.tm.clear_display()
-        self.tm.roll()
-        sleep(1)
-
-        self.selected_game = self._game_register[selected_game_name]
-        self.show_selected_game()
+        self.selected_game = self._build_game(selected_game_name)
+
+        if self.puzzle_pool is not None:
+            # the puzzles of the games created so far are generated while the selected game is played
+            for game_name, game in self._game_register.items():
+                if isinstance(game, MiniGame) and game.pregenerable:
+                    self.puzzle_pool.add_game(game_name, game)
+                    game.puzzle_source = partial(self.puzzle_pool.take, game_name)
+
+        # the selected game is shown after the roll (played by the standby loop)
+        self.play_animation(self.tm.roll(block=False))
+        self.play_animation(pause(1, on_finish=self.show_selected_game))
+        if self._animations:
+            # the first frame is drawn now rather than after the first button read of the standby loop
+            self._step_animations(0)
+        else:
+            self.show_selected_game()
 
     def setup(self) -> None:
         """
@@ -329,6 +709,21 @@ class SevenSegButtonGame:
             self.selected_game.setup()
             self._setup_run = True
 
+    def reset(self) -> None:
+        """
+        Forgets the registered games and returns to standby, so that new games can be registered and selected for
+        another round (the boards are kept as they are).
+        """
+        self._game_register.clear()
+        self.selected_game = None
+        self._game_select = 0
+        self._setup_run = False
+        self.in_standby = True
+        self._standby_presses = 0
+        self._input_events.clear()
+        self._animations.clear()
+        self._game_display_pending = False
+
     def show_selected_game(self) -> None:
         """
         Displays the selected game on the LED display by the number of lit LEDs
@@ -340,9 +735,20 @@ class SevenSegButtonGame:
         Executes game display then awaits user activation of the game(s)
         """
         # show selected game number and get the player input
-        player_input = self._check_new_input()
+        with self.tm.tick():
+            self._standby_turn(self._check_new_input())
+
+    def _standby_turn(self,
+                      player_input: int) -> None:
+        """
+        Standby handling of one button input (see standby_start_loop)
+
+        :param player_input: Integer of the new button input
+        """
+        if self._step_animations(player_input):
+            return
         if player_input > 0:
-            if player_input == 64:
+            if player_input == self.standby_button:
                 self._standby_presses += 1
             else:
                 self.selected_game.final_display(set_lose=False)
@@ -351,9 +757,19 @@ class SevenSegButtonGame:
         if self._standby_presses >= 2:
             self.in_standby = False
             self.setup()
-            self.tm.display_line(self.selected_game.game_seg_display)
-            self.tm.LEDs(self.selected_game.game_LED_display)
+            # the game screen is shown once the game's intro animation has been played by game_loop()
+            self.play_animation(self.selected_game.intro_animation)
+            self._game_display_pending = True
+            if not self._animations:
+                self._show_game_display()
 
+    def _show_game_display(self) -> None:
+        """
+        Shows the starting screen of the selected game
+        """
+        self._game_display_pending = False
+        self.tm.display_line(self.selected_game.game_seg_display)
+        self.tm.LEDs(self.selected_game.game_LED_display)
 
     def game_loop(self) -> None:
         """
@@ -364,12 +780,34 @@ class SevenSegButtonGame:
         """
         assert self._setup_run, "Please call setup() from the main file before entering the loop"
 
-        # get the player input
-        player_input = self._check_new_input()
-        # pass the player input to the game to play a turn
-        if player_input > 0:
-            if self.selected_game.show_button_feedback:
-                self.tm.LEDs(player_input)
-            self.selected_game.play(player_input)
-        elif self.selected_game.show_button_feedback:
-            self.tm.LEDs(0)
+        # the writes of the loop call are sent as one frame
+        with self.tm.tick():
+            # get the player input
+            event = self._next_input_event()
+            # pass the player input to the game to play a turn
+            if self._prepare_turn(event):
+                self.selected_game.play(event)
+
+    def _prepare_turn(self,
+                      event: Optional[InputEvent]) -> bool:
+        """
+        Handles everything in a game loop call besides the turn itself: animations, the game screen and the button
+        feedback. Only new presses and chords cancel the animations and light the feedback LEDs, long presses and
+        repeats of a held button are only passed on to the games taking them.
+
+        :param event: the input event of the loop call (None if there is none)
+        :return: True if a turn should be played with the event
+        """
+        player_input = self._press_mask(event)
+        if self._step_animations(player_input):
+            return False
+        if self._game_display_pending:
+            self._show_game_display()
+
+        if player_input > 0 and self.selected_game.show_button_feedback:
+            # the LEDs of the pressed buttons are lit over the game LEDs until the next loop call
+            self.tm.compositor.layers['feedback'].set_leds(player_input, player_input)
+            self.tm.commit()
+        elif self.tm.compositor.layers['feedback'].led_mask:
+            self.tm.clear_layer('feedback')
+        return event is not None and event.kind in self.selected_game.input_kinds
@@ -0,0 +1,325 @@
+"""
+Recording and replay of game sessions.
+
+A SessionRecorder attached to a SevenSegButtonGame logs every change of the raw button input and every frame
+committed to the boards, with their times, to a compact binary file. It also seeds the random module and stores the
+seed, so that a session can be reproduced. SessionReplayer feeds a recorded session back through a
+SevenSegButtonGame (typically on VirtualTMBoards), at real time or as fast as the game allows, and checks that the
+game shows the same frames.
+
+Inputs are replayed at the same button read as recorded: each input record holds the number of reads made while the
+game was idle (no animation playing) since the previous input, and whether it was made during an animation.
+
+File format (little endian):
+    header:  magic b'TMSR', version (B), number of boards (B), 2 pad bytes, seed (Q), start time (d, epoch seconds)
+    records: kind (B), microseconds since the previous record (I), then
+             - input: idle reads since the previous input (I), the button integer as 1 byte per board (big endian)
+             - frame: the register image, 16 bytes per board
+    The ANIMATION flag is set on animation frames, and on inputs made while an animation was playing.
+"""
+import random
+import struct
+import time
+from typing import BinaryIO, List, NamedTuple, Optional, Union
+
+MAGIC: bytes = b'TMSR'
+VERSION: int = 1
+
+HEADER = struct.Struct('<4sBBxxQd')
+RECORD = struct.Struct('<BI')
+INPUT_READS = struct.Struct('<I')
+
+# record kinds and flags
+INPUT: int = 0x01
+FRAME: int = 0x02
+ANIMATION: int = 0x80
+
+_MAX_DELTA_US: int = 0xFFFFFFFF
+
+
+class SessionRecord(NamedTuple):
+    """
+    A record of a session log
+    """
+    kind: int  # INPUT or FRAME
+    animation: bool  # animation frame, or input made during an animation
+    time: float  # seconds since the start of the session
+    value: Union[int, bytes]  # button integer (INPUT) or register image (FRAME)
+    idle_reads: int = 0  # button reads made while the game was idle since the previous input (INPUT)
+
+
+class SessionRecorder:
+    """
+    Records the raw button input and the committed frames of a SevenSegButtonGame
+    """
+    def __init__(self,
+                 file: Union[str, BinaryIO],
+                 seed: Optional[int] = None,
+                 flush_size: int = 65536) -> None:
+        """
+        :param file: path or binary file to write the log to
+        :param seed: seed of the random module for the session (random if None)
+        :param flush_size: number of buffered bytes written to the file at once
+        """
+        self._file: BinaryIO = open(file, 'wb') if isinstance(file, str) else file
+        self._owns_file: bool = isinstance(file, str)
+        self.seed: int = seed if seed is not None else random.randrange(1 << 64)
+        self.flush_size: int = flush_size
+
+        self._buffer: bytearray = bytearray()
+        self._game = None
+        self._num_boards: int = 1
+        self._start: float = 0.0
+        self._last_us: int = 0
+        self._last_input: int = 0
+        self._idle_reads: int = 0
+        self.inputs: int = 0
+        self.frames: int = 0
+
+    def attach(self, seg_game) -> None:
+        """
+        Seeds the random module and starts recording a game. Attach before select_game() for the session to be
+        reproducible.
+
+        :param seg_game: the SevenSegButtonGame to record
+        """
+        random.seed(self.seed)
+        self._game = seg_game
+        self._num_boards = seg_game.tm.num_boards
+        self._start = time.monotonic()
+        self._buffer += HEADER.pack(MAGIC, VERSION, self._num_boards, self.seed, time.time())
+        seg_game.recorder = self
+        seg_game.tm.on_commit = self.record_frame
+
+    def _record(self, kind: int, payload: bytes) -> None:
+        now_us = int((time.monotonic() - self._start) * 1e6)
+        self._buffer += RECORD.pack(kind, min(now_us - self._last_us, _MAX_DELTA_US))
+        self._buffer += payload
+        self._last_us = now_us
+        if len(self._buffer) >= self.flush_size:
+            self.flush()
+
+    def record_input(self, mask: int) -> None:
+        """
+        Records a raw button reading (only changes are stored)
+        """
+        game = self._game
+        if not (game._animations or game._game_display_pending):
+            self._idle_reads += 1
+        if mask == self._last_input:
+            return
+        self._last_input = mask
+        kind = INPUT | ANIMATION if game._animations else INPUT
+        self._record(kind, INPUT_READS.pack(self._idle_reads) + mask.to_bytes(self._num_boards, 'big'))
+        self._idle_reads = 0
+        self.inputs += 1
+
+    def record_frame(self,
+                     image: bytes,
+                     animation: bool = False) -> None:
+        """
+        Records a committed register image
+        """
+        self._record(FRAME | ANIMATION if animation else FRAME, bytes(image))
+        self.frames += 1
+
+    def flush(self) -> None:
+        """
+        Writes the buffered records to the file
+        """
+        self._file.write(self._buffer)
+        self._file.flush()
+        self._buffer.clear()
+
+    def close(self) -> None:
+        """
+        Detaches from the game and writes the remaining records
+        """
+        if self._game is not None:
+            self._game.recorder = None
+            self._game.tm.on_commit = None
+            self._game = None
+        self.flush()
+        if self._owns_file:
+            self._file.close()
+
+
+def read_session(file: Union[str, BinaryIO]):
+    """
+    Reads a session log
+
+    :param file: path or binary file of the log
+    :return: (seed, number of boards, start time, list of SessionRecords)
+    :raises ValueError: if the file is not a session log, or is truncated
+    """
+    if isinstance(file, str):
+        with open(file, 'rb') as log:
+            data = log.read()
+    else:
+        data = file.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError("Not a session log")
+    magic, version, num_boards, seed, start_time = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a session log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported session log version {version}")
+
+    sizes = {INPUT: INPUT_READS.size + num_boards, FRAME: 16 * num_boards}
+    records = []
+    offset = HEADER.size
+    elapsed_us = 0
+    while offset < len(data):
+        if offset + RECORD.size > len(data):
+            raise ValueError(f"The session log is truncated (record at byte {offset})")
+        kind, delta_us = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        base_kind = kind & ~ANIMATION
+        if base_kind not in sizes:
+            raise ValueError(f"Unknown record kind {kind:#x} at byte {offset - RECORD.size}")
+        if offset + sizes[base_kind] > len(data):
+            raise ValueError(f"The session log is truncated (record at byte {offset - RECORD.size})")
+        payload = data[offset:offset + sizes[base_kind]]
+        offset += sizes[base_kind]
+        elapsed_us += delta_us
+        if base_kind == INPUT:
+            idle_reads, = INPUT_READS.unpack_from(payload)
+            value = int.from_bytes(payload[INPUT_READS.size:], 'big')
+        else:
+            idle_reads = 0
+            value = payload
+        records.append(SessionRecord(base_kind, bool(kind & ANIMATION), elapsed_us / 1e6, value, idle_reads))
+    return seed, num_boards, start_time, records
+
+
+class ReplayResult(NamedTuple):
+    """
+    Outcome of a replay. Only game frames are compared, animation frames depend on timing and are just counted.
+    """
+    matched: bool
+    expected_frames: int
+    replayed_frames: int
+    mismatches: List[int]  # indexes (in the game frames) of the frames that differ
+    animation_frames: int  # animation frames shown by the replay
+    duration: float
+
+
+class SessionReplayer:
+    """
+    Plays a recorded session back through a SevenSegButtonGame
+    """
+    def __init__(self,
+                 file: Union[str, BinaryIO]) -> None:
+        """
+        :param file: path or binary file of the session log
+        """
+        self.seed, self.num_boards, self.start_time, self.records = read_session(file)
+        self.inputs: List[SessionRecord] = [record for record in self.records if record.kind == INPUT]
+        self.game_frames: List[bytes] = [record.value for record in self.records
+                                         if record.kind == FRAME and not record.animation]
+
+    def replay(self,
+               seg_game,
+               real_time: bool = False,
+               selected_game_name: Optional[str] = None,
+               settle_loops: int = 100) -> ReplayResult:
+        """
+        Replays the session. The game must have its games registered (as when recorded) and must not have selected a
+        game yet.
+
+        Each input is applied at the button read it was recorded at: after the same number of reads while the game
+        is idle, and while an animation plays for inputs made during an animation (after the animations for the
+        others). At real time, the loop also waits for the recorded time of each input before applying it. At
+        maximum speed the buttons are read without pause, the error pauses of the game are skipped and the clock of
+        the animations runs ahead to their next frame, so the replay does not wait for the animations; long presses
+        and repeats are then not reproduced (only at real time).
+
+        :param seg_game: SevenSegButtonGame to play the session with
+        :param real_time: applies the inputs at their recorded times
+        :param selected_game_name: game to select (the seeded random selection is used by default)
+        :param settle_loops: loop calls made after the last input (once the animations are over) before stopping
+        :return: the comparison of the replayed and recorded game frames
+        """
+        assert seg_game.tm.num_boards == self.num_boards, \
+            f"The session was recorded with {self.num_boards} board(s), the game has {seg_game.tm.num_boards}"
+
+        replayed: List[bytes] = []
+        animation_frames = 0
+
+        def on_commit(image: bytes, animation: bool) -> None:
+            nonlocal animation_frames
+            if animation:
+                animation_frames += 1
+            else:
+                replayed.append(bytes(image))
+
+        current_mask = 0
+        seg_game.read_buttons = lambda: current_mask
+        seg_game.tm.on_commit = on_commit
+
+        # at maximum speed the animations are stepped with a clock running ahead of the monotonic clock by the
+        # time skipped so far
+        skipped = 0.0
+
+        def clock() -> float:
+            return time.monotonic() + skipped
+
+        if not real_time:
+            seg_game.clock = clock
+
+        random.seed(self.seed)
+        start = time.monotonic()
+        seg_game.select_game(selected_game_name)
+        if not real_time:
+            seg_game.selected_game.sleep = lambda seconds: None
+
+        index = 0
+        idle_reads = 0
+        settled = 0
+        while seg_game.selected_game.continue_loop or seg_game._animations:
+            busy = bool(seg_game._animations) or seg_game._game_display_pending
+            if not busy:
+                idle_reads += 1
+            if index < len(self.inputs):
+                record = self.inputs[index]
+                due = idle_reads >= record.idle_reads
+                if record.animation:
+                    # made during an animation (or the animation is already over)
+                    due = due and (bool(seg_game._animations) or idle_reads > record.idle_reads)
+                else:
+                    # made once the animations were over: not while one still plays (it would cancel it)
+                    due = due and not seg_game._animations
+                if due and real_time:
+                    # the input waits for its recorded time at its recorded read, rather than after idle reads
+                    wait = record.time - (time.monotonic() - start)
+                    if wait > 0:
+                        time.sleep(wait)
+                if due:
+                    current_mask = record.value
+                    index += 1
+                    idle_reads = 0
+            elif not busy:
+                settled += 1
+                if settled > settle_loops:
+                    break
+
+            if not real_time and seg_game._animations:
+                # skip to the next frame of the animation
+                skipped += max(0.0, seg_game._animations[0].next_deadline - clock())
+
+            if seg_game.in_standby:
+                seg_game.standby_start_loop()
+            else:
+                seg_game.game_loop()
+
+        seg_game.tm.on_commit = None
+        seg_game.clock = time.monotonic
+        seg_game.selected_game.sleep = time.sleep
+        mismatches = [i for i, (expected, seen) in enumerate(zip(self.game_frames, replayed)) if expected != seen]
+        return ReplayResult(matched=not mismatches and len(replayed) == len(self.game_frames),
+                            expected_frames=len(self.game_frames),
+                            replayed_frames=len(replayed),
+                            mismatches=mismatches,
+                            animation_frames=animation_frames,
+                            duration=time.monotonic() - start)
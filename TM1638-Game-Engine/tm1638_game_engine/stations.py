@@ -0,0 +1,190 @@
+"""
+Several game stations driven by one process.
+
+A StationManager runs the AsyncSevenSegButtonGame of every station as a task of a single asyncio event loop. Each
+station reads its buttons on its own schedule (every poll_interval) and shows its animation frames at their
+deadlines, and sleeps in between: N stations need neither N processes nor any busy-wait. Every step of a station
+is a single loop call (one button read, animation frame or turn) after which the station yields, and the event loop
+wakes the stations in deadline order, so a station cannot hold up the polling or the display of the others beyond
+one step.
+
+The turns are played with MiniGame.play_async(), so the pauses of the turns (e.g. error_pause) are awaited. MiniGame
+callbacks that block (e.g. time.sleep) still hold up every station: they should be coroutine functions to wait.
+
+Stats of each station (StationManager.stats()):
+    'poll_lateness' - how late each step started after its due time (input poll or animation frame)
+    'step'          - the time taken by each step
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .async_game_engine import AsyncSevenSegButtonGame
+from .instrumentation import DEFAULT_BOUNDS_US, Histogram
+from .seg_game_engine import SevenSegButtonGame
+
+
+class Station:
+    """
+    An AsyncSevenSegButtonGame hosted by a StationManager, with its latency stats
+    """
+    def __init__(self,
+                 name: str,
+                 seg_game: AsyncSevenSegButtonGame,
+                 register_games: Optional[Callable[[SevenSegButtonGame], None]] = None,
+                 selected_game_name: Optional[str] = None,
+                 rounds: Optional[int] = 1,
+                 bounds_us: Sequence[float] = DEFAULT_BOUNDS_US) -> None:
+        """
+        :param name: name of the station in the stats
+        :param seg_game: the game of the station (with its own pins or device). A plain SevenSegButtonGame is not
+            accepted: its turns run the pauses with time.sleep(), which would block every station.
+        :param register_games: registers new games with seg_game, called before every round (the games of a
+            round cannot be played again). If None, the games must already be registered and only one round is played.
+        :param selected_game_name: game played by every round (random by default)
+        :param rounds: number of games played before the station stops (None to play forever)
+        :param bounds_us: upper bounds of the histogram buckets in microseconds
+        """
+        assert isinstance(seg_game, AsyncSevenSegButtonGame), \
+            f"Station {name} needs an AsyncSevenSegButtonGame, the turns of a SevenSegButtonGame block every station"
+        assert rounds == 1 or register_games is not None, "Playing more than one round requires register_games"
+        self.name: str = name
+        self.seg_game: AsyncSevenSegButtonGame = seg_game
+        self.register_games: Optional[Callable[[SevenSegButtonGame], None]] = register_games
+        self.selected_game_name: Optional[str] = selected_game_name
+        self.rounds: Optional[int] = rounds
+
+        self.poll_lateness: Histogram = Histogram(bounds_us)
+        self.step_time: Histogram = Histogram(bounds_us)
+        self.steps: int = 0
+        self.rounds_played: int = 0
+        self.started: Optional[float] = None
+
+    async def step(self) -> None:
+        """
+        Makes one loop call of the game (standby or game loop)
+        """
+        seg_game = self.seg_game
+        if seg_game.in_standby:
+            await seg_game.standby_start_loop_async()
+        else:
+            await seg_game.game_loop_async()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of the station's stats
+        """
+        uptime = time.monotonic() - self.started if self.started is not None else 0.0
+        return {'rounds_played': self.rounds_played,
+                'steps': self.steps,
+                'steps_per_sec': self.steps / uptime if uptime else 0.0,
+                'in_standby': self.seg_game.in_standby,
+                'poll_lateness': self.poll_lateness.as_dict(),
+                'step': self.step_time.as_dict()}
+
+
+class StationManager:
+    """
+    Runs the games of several stations on one asyncio event loop
+    """
+    def __init__(self,
+                 poll_interval: float = 0.05,
+                 end_pause: float = 2.0) -> None:
+        """
+        :param poll_interval: seconds between the button reads of each station
+        :param end_pause: seconds the end of a game is shown before the display is cleared
+        """
+        self.poll_interval: float = poll_interval
+        self.end_pause: float = end_pause
+        self.stations: Dict[str, Station] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def add_station(self,
+                    name: str,
+                    seg_game: AsyncSevenSegButtonGame,
+                    register_games: Optional[Callable[[SevenSegButtonGame], None]] = None,
+                    selected_game_name: Optional[str] = None,
+                    rounds: Optional[int] = 1) -> Station:
+        """
+        Adds a station (see Station for the parameters). Stations are added before run() is called.
+
+        :return: the station
+        """
+        assert name not in self.stations, f"A station is already named {name}"
+        station = Station(name, seg_game, register_games, selected_game_name, rounds)
+        self.stations[name] = station
+        return station
+
+    def _next_due(self,
+                  seg_game: AsyncSevenSegButtonGame,
+                  due: float) -> float:
+        """
+        Time of the next step of a station: its next button read, or its next animation frame if sooner. A station
+        running late is not made to catch up with the reads it missed.
+        """
+        now = time.monotonic()
+        next_due = max(due + self.poll_interval, now)
+        if seg_game._animations:
+            next_due = min(next_due, max(seg_game._animations[0].next_deadline, now))
+        return next_due
+
+    async def _run_station(self,
+                           station: Station) -> None:
+        """
+        Plays the rounds of a station
+        """
+        seg_game = station.seg_game
+        station.started = time.monotonic()
+        while station.rounds is None or station.rounds_played < station.rounds:
+            if station.register_games is not None:
+                if station.rounds_played:
+                    seg_game.reset()
+                if not seg_game._game_register:
+                    station.register_games(seg_game)
+            seg_game.select_game(station.selected_game_name)
+
+            due = time.monotonic()
+            while seg_game.selected_game.continue_loop:
+                start = time.monotonic()
+                station.poll_lateness.record(int(max(0.0, start - due) * 1e9))
+                step_start = time.perf_counter_ns()
+                await station.step()
+                station.step_time.record(time.perf_counter_ns() - step_start)
+                station.steps += 1
+
+                due = self._next_due(seg_game, due)
+                # always yield, so that the other stations due get their turn
+                await asyncio.sleep(max(0.0, due - time.monotonic()))
+
+            station.rounds_played += 1
+            await asyncio.sleep(self.end_pause)
+            seg_game.tm.clear_display()
+
+    async def run(self) -> None:
+        """
+        Runs every station until they have all played their rounds (or stop() is called)
+        """
+        assert self.stations, "No stations! Please add at least 1 station."
+        self._tasks = [asyncio.create_task(self._run_station(station), name=f'station-{name}')
+                       for name, station in self.stations.items()]
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # a station failing stops the others
+            self.stop()
+            self._tasks = []
+
+    def stop(self) -> None:
+        """
+        Stops every station (from the event loop, e.g. by a task or signal handler)
+        """
+        for task in self._tasks:
+            task.cancel()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Snapshot of the stats of every station
+        """
+        return {name: station.stats() for name, station in self.stations.items()}
@@ -6,8 +6,8 @@ anim.roll()
 anim.wave()
 anim.load()
 anim.unload()
-anim.LEDs_from_left(8)
+anim.LEDs_from_left(anim.num_leds)
 time.sleep(5)
-anim.LEDs_from_left(4)
+anim.LEDs_from_left(anim.num_leds // 2)
 time.sleep(5)
 anim.clear_display()
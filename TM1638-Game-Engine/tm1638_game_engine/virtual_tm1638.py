@@ -0,0 +1,265 @@
+"""
+In-memory emulation of chained TM1638 boards.
+
+VirtualTMBoards follows the TM1638 command protocol (data, address and display control commands, display registers,
+key-scan bytes) and offers the interface of the rpi-TM1638 TMBoards driver, so it can be used in its place:
+
+    tm = TM1638Animated(stb=0, clk=0, dio=0, device=VirtualTMBoards(stb=(0, 1)))
+
+The whole engine then runs headless at full speed (no GPIO, no bus timing) with the buttons driven by set_key_mask()
+or a key script, and the display state can be read back from the registers.
+"""
+from collections import deque
+from typing import Deque, Iterable, List, Optional, Sequence, Union
+
+from .rpi_tm1638_overrides import SegmentsOverride, SwitchesOverride
+
+
+# TM1638 commands (the two highest bits select the command type)
+DATA_COMMAND: int = 0x40
+DISPLAY_COMMAND: int = 0x80
+ADDRESS_COMMAND: int = 0xC0
+
+# data command flags
+READ_KEYS: int = 0x02
+FIXED_ADDRESS: int = 0x04
+
+# display control flags
+DISPLAY_ON: int = 0x08
+
+
+def encode_key_bytes(mask: int) -> bytes:
+    """
+    Encodes the switches of a board (first switch = most significant bit) into the 4 key-scan bytes of the TM1638:
+    switch n is bit 0 (n < 4) or bit 4 (n >= 4) of key-scan byte n % 4.
+
+    :param mask: integer of the pressed switches of the board
+    """
+    data = bytearray(4)
+    for switch in range(8):
+        if mask & (0x80 >> switch):
+            data[switch % 4] |= 0x10 if switch >= 4 else 0x01
+    return bytes(data)
+
+
+class VirtualLeds:
+    """
+    LEDs of the virtual boards, mirroring the Leds class of the driver (leds[i] = <bool>)
+    """
+    def __init__(self, TM: 'VirtualTMBoards') -> None:
+        self._TM = TM
+
+    def __setitem__(self, index: int, value: bool) -> None:
+        self._TM.sendData((index % 8) * 2 + 1, 1 if value else 0, index // 8)
+
+    def __getitem__(self, index: int) -> bool:
+        return bool(self._TM.registers[16 * (index // 8) + (index % 8) * 2 + 1] & 1)
+
+
+class VirtualTMBoards:
+    """
+    Emulates a chain of TM1638 boards sharing the clock and data lines (one strobe pin per board).
+    """
+    # the virtual boards need no pause between button reads (see TM1638Animated.check_button_values)
+    key_read_pause: float = 0.0
+
+    def __init__(self,
+                 dio: Optional[int] = None,
+                 clk: Optional[int] = None,
+                 stb: Union[int, Sequence[int]] = 0,
+                 brightness: int = 1) -> None:
+        """
+        :param dio: data pin (unused, kept for TMBoards compatibility)
+        :param clk: clock pin (unused, kept for TMBoards compatibility)
+        :param stb: strobe pin, or tuple of strobe pins (one per chained board)
+        :param brightness: initial brightness of the boards (0 - 7)
+        """
+        self.dio = dio
+        self.clk = clk
+        self.stb: tuple = tuple(stb) if isinstance(stb, (list, tuple)) else (stb,)
+
+        # chip state of every board
+        self.registers: bytearray = bytearray(16 * self.nbBoards)
+        self.keys: bytearray = bytearray(4 * self.nbBoards)
+        self.brightness: List[int] = [0] * self.nbBoards
+        self.display_on: List[bool] = [False] * self.nbBoards
+        self._address: List[int] = [0] * self.nbBoards
+        self._fixed_address: List[bool] = [False] * self.nbBoards
+        self._read_keys: List[bool] = [False] * self.nbBoards
+
+        # bus activity
+        self.transactions: int = 0
+        self.bytes_sent: int = 0
+        self.key_reads: int = 0
+
+        # button masks (whole chain) applied one per key scan of the chain
+        self.key_script: Deque[int] = deque()
+
+        self._leds = VirtualLeds(self)
+        self._segments = SegmentsOverride(self)
+        self._switches = SwitchesOverride(self)
+
+        self.turnOn(brightness)
+        self.clearDisplay()
+
+    @property
+    def nbBoards(self) -> int:
+        return len(self.stb)
+
+    @property
+    def leds(self) -> VirtualLeds:
+        return self._leds
+
+    @property
+    def segments(self) -> SegmentsOverride:
+        return self._segments
+
+    @property
+    def switches(self) -> SwitchesOverride:
+        return self._switches
+
+    # ----------------- #
+    #     Protocol      #
+    # ----------------- #
+
+    def _boards(self, TMindex: Optional[int]) -> range:
+        """
+        Boards addressed by a transaction (all boards if TMindex is None)
+        """
+        return range(self.nbBoards) if TMindex is None else range(TMindex, TMindex + 1)
+
+    def _transaction(self,
+                     board: int,
+                     data: Sequence[int]) -> None:
+        """
+        One strobe-low transaction with a board: a command byte followed by data bytes (written to the display
+        registers from the current address).
+        """
+        self.transactions += 1
+        self.bytes_sent += len(data)
+
+        command = data[0]
+        kind = command & 0xC0
+        if kind == DATA_COMMAND:
+            self._read_keys[board] = bool(command & READ_KEYS)
+            self._fixed_address[board] = bool(command & FIXED_ADDRESS)
+        elif kind == DISPLAY_COMMAND:
+            self.display_on[board] = bool(command & DISPLAY_ON)
+            self.brightness[board] = command & 0x07
+        elif kind == ADDRESS_COMMAND:
+            self._address[board] = command & 0x0F
+
+        if len(data) > 1:
+            assert kind == ADDRESS_COMMAND and not self._read_keys[board], \
+                "Display data must follow a write data command and an address command"
+            offset = 16 * board
+            address = self._address[board]
+            for value in data[1:]:
+                self.registers[offset + address] = value
+                if not self._fixed_address[board]:
+                    address = (address + 1) & 0x0F
+            self._address[board] = address
+
+    def sendCommand(self,
+                    cmd: int,
+                    TMindex: Optional[int] = None) -> None:
+        """
+        Sends a command to a board (to all boards if TMindex is None)
+        """
+        for board in self._boards(TMindex):
+            self._transaction(board, (cmd,))
+
+    def sendData(self,
+                 addr: int,
+                 data: int,
+                 TMindex: int = 0) -> None:
+        """
+        Writes a single display register (fixed address write)
+        """
+        self.sendCommand(DATA_COMMAND | FIXED_ADDRESS, TMindex)
+        self._transaction(TMindex, (ADDRESS_COMMAND | addr, data))
+
+    def sendBurst(self,
+                  addr: int,
+                  data: Sequence[int],
+                  TMindex: int = 0) -> None:
+        """
+        Writes consecutive display registers in a single transaction (automatic address increment)
+        """
+        self.sendCommand(DATA_COMMAND, TMindex)
+        self._transaction(TMindex, (ADDRESS_COMMAND | addr, *data))
+
+    def getData(self, TMindex: int) -> bytes:
+        """
+        Reads the 4 key-scan bytes of a board
+        """
+        if TMindex == 0 and self.key_script:
+            self.set_key_mask(self.key_script.popleft())
+        self.sendCommand(DATA_COMMAND | READ_KEYS, TMindex)
+        self.key_reads += 1
+        return bytes(self.keys[4 * TMindex:4 * (TMindex + 1)])
+
+    def clearDisplay(self, TMindex: Optional[int] = None) -> None:
+        """
+        Turns off every segment and LED of a board (of all boards if TMindex is None)
+        """
+        for board in self._boards(TMindex):
+            self.sendBurst(0, bytes(16), board)
+
+    def turnOn(self,
+               brightness: int = 7,
+               TMindex: Optional[int] = None) -> None:
+        """
+        Turns the display on with the given brightness (0 - 7)
+        """
+        self.sendCommand(DISPLAY_COMMAND | DISPLAY_ON | (brightness & 0x07), TMindex)
+
+    def turnOff(self, TMindex: Optional[int] = None) -> None:
+        """
+        Turns the display off (the registers are kept)
+        """
+        self.sendCommand(DISPLAY_COMMAND, TMindex)
+
+    # ----------------- #
+    #      Buttons      #
+    # ----------------- #
+
+    def set_key_mask(self, mask: int) -> None:
+        """
+        Sets the pressed buttons of the whole chain (first button of the first board = most significant bit)
+        """
+        for board in range(self.nbBoards):
+            board_mask = (mask >> 8 * (self.nbBoards - 1 - board)) & 0xFF
+            self.keys[4 * board:4 * (board + 1)] = encode_key_bytes(board_mask)
+
+    def script_keys(self, masks: Iterable[int]) -> None:
+        """
+        Queues button masks, one being applied at each key scan of the chain (each read of the first board).
+        The last applied mask stays pressed once the script runs out.
+        """
+        self.key_script.extend(masks)
+
+    # ----------------- #
+    #   Display state   #
+    # ----------------- #
+
+    def segment_values(self) -> bytes:
+        """
+        Segment values of every display of the chain
+        """
+        return bytes(self.registers[0::2])
+
+    def led_mask(self) -> int:
+        """
+        Integer of the lit LEDs of the chain (first LED = most significant bit)
+        """
+        value = 0
+        for register in self.registers[1::2]:
+            value = value << 1 | (register & 1)
+        return value
+
+    def reset_counters(self) -> None:
+        """
+        Resets the bus activity counters
+        """
+        self.transactions = self.bytes_sent = self.key_reads = 0